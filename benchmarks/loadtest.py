@@ -0,0 +1,203 @@
+"""端到端压测：python benchmarks/loadtest.py <截图目录> [-c 8] [-n 200] [--qat-latency-ms 200] ...
+
+启动本地 QAT 替身，在子进程中用 flask_app.create_app() 运行应用（QAT_URL 指向替身），
+然后以给定并发循环执行 “上传截图 → /api/analyze”，输出各接口的吞吐量与 p50/p95/p99 延迟。
+调整 --qat-error-rate、--qat-timeout、--qat-tries 可观察 req_qat 的重试与超时对尾延迟的影响。
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from qat_stub import QatStub, start_stub
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+IMAGE_EXT = ('.png', '.jpg', '.jpeg', '.bmp')
+
+_SERVER = r"""
+import logging
+import sys
+from werkzeug.serving import make_server
+import flask_app
+logging.getLogger("werkzeug").setLevel(logging.WARNING)
+server = make_server("127.0.0.1", int(sys.argv[1]), flask_app.create_app(), threaded=True)
+print("listening", flush=True)
+server.serve_forever()
+"""
+
+
+def percentile(values, p):
+    """最近秩法求百分位数：排序后第 ceil(p/100 * n) 个"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(max(1, math.ceil(p / 100 * len(ordered))), len(ordered))
+    return ordered[rank - 1]
+
+
+def summarize(samples, duration):
+    ok = [s for s, success in samples if success]
+    return {
+        "count": len(samples),
+        "errors": len(samples) - len(ok),
+        "throughput_rps": len(samples) / duration if duration else 0.0,
+        "mean_ms": statistics.fmean(ok) if ok else None,
+        "p50_ms": percentile(ok, 50),
+        "p95_ms": percentile(ok, 95),
+        "p99_ms": percentile(ok, 99),
+        "max_ms": max(ok) if ok else None,
+    }
+
+
+def parse_metrics(text):
+    """从 Prometheus 文本中取出 QAT 相关指标"""
+    result = {}
+    for line in text.splitlines():
+        if line.startswith("wordatro_qat_") or 'stage="qat_fetch"' in line:
+            name, value = line.rsplit(" ", 1)
+            result[name] = float(value)
+    return result
+
+
+def _wait_ready(proc, base_url, timeout):
+    """等待 /api/ready 返回 200；子进程退出或超时时抛出异常，附上最后一次的响应"""
+    deadline = time.monotonic() + timeout
+    last = None
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"应用进程已退出（退出码 {proc.returncode}），/api/ready: {last}")
+        try:
+            resp = requests.get(f"{base_url}/api/ready", timeout=5)
+            if resp.status_code == 200:
+                return
+            last = f"{resp.status_code} {resp.text.strip()}"
+        except requests.RequestException as e:
+            last = repr(e)
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"应用在 {timeout} 秒内未就绪，/api/ready: {last}")
+        time.sleep(0.05)
+
+
+def start_app(port, env, ready_timeout=120.0):
+    proc = subprocess.Popen([sys.executable, "-c", _SERVER, str(port)], cwd=ROOT_DIR,
+                            env=env, stdout=subprocess.PIPE, text=True)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for line in proc.stdout:
+            if line.startswith("listening"):
+                break
+        else:
+            raise RuntimeError("应用启动失败")
+        threading.Thread(target=proc.stdout.read, daemon=True).start()
+        _wait_ready(proc, base_url, ready_timeout)
+    except BaseException:
+        proc.terminate()
+        proc.wait()
+        raise
+    return proc, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument("corpus", help="截图目录")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("-n", "--requests", type=int, default=100, help="上传 + 分析的总轮数")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("-d", "--dictionary", default="YAWL")
+    parser.add_argument("-s", "--strategy", default="bold97")
+    parser.add_argument("--qat-latency-ms", type=float, default=200.0)
+    parser.add_argument("--qat-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--qat-error-rate", type=float, default=0.0)
+    parser.add_argument("--qat-timeout", type=float, default=10.0)
+    parser.add_argument("--qat-tries", type=int, default=3)
+    parser.add_argument("--qat-retry-delay", type=float, default=1.0)
+    parser.add_argument("--ready-timeout", type=float, default=120.0,
+                        help="等待应用就绪（/api/ready 返回 200）的最长秒数")
+    args = parser.parse_args()
+
+    corpus = [os.path.join(args.corpus, f) for f in sorted(os.listdir(args.corpus))
+              if f.lower().endswith(IMAGE_EXT)]
+    if not corpus:
+        parser.error(f"{args.corpus} 中没有截图")
+
+    stub = QatStub(args.qat_latency_ms, args.qat_jitter_ms, args.qat_error_rate)
+    stub_server, qat_url = start_stub(stub)
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, LOG_LEVEL="WARNING", QAT_URL=qat_url,
+               QAT_TIMEOUT=str(args.qat_timeout), QAT_TRIES=str(args.qat_tries),
+               QAT_RETRY_DELAY=str(args.qat_retry_delay))
+    try:
+        proc, base_url = start_app(args.port, env, args.ready_timeout)
+    except BaseException:
+        stub_server.shutdown()
+        raise
+
+    samples = {"upload": [], "analyze": []}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def _timed(endpoint, func):
+        start = time.perf_counter()
+        try:
+            resp = func()
+            body = resp.json()
+            success = resp.status_code == 200 and body["code"] == 0
+        except Exception:
+            body, success = None, False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            samples[endpoint].append((elapsed, success))
+        return body if success else None
+
+    def _iteration(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        session = local.session
+        path = corpus[i % len(corpus)]
+        with open(path, "rb") as fp:
+            data = fp.read()
+        body = _timed("upload", lambda: session.post(
+            f"{base_url}/api/upload/", files={"file": (os.path.basename(path), data)}))
+        if body is None:
+            return
+        _timed("analyze", lambda: session.post(f"{base_url}/api/analyze", json={
+            "filename": body["data"]["filename"],
+            "dictionary": args.dictionary,
+            "strategy": args.strategy,
+        }))
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(_iteration, range(args.requests)))
+        duration = time.perf_counter() - started
+        server_metrics = parse_metrics(requests.get(f"{base_url}/api/metrics").text)
+    finally:
+        proc.terminate()
+        proc.wait()
+        stub_server.shutdown()
+
+    print(json.dumps({
+        "duration_s": duration,
+        "concurrency": args.concurrency,
+        "iterations": args.requests,
+        "endpoints": {name: summarize(s, duration) for name, s in samples.items()},
+        "qat_stub": {"requests": stub.requests, "errors": stub.errors,
+                     "latency_ms": args.qat_latency_ms, "jitter_ms": args.qat_jitter_ms,
+                     "error_rate": args.qat_error_rate},
+        "qat_client": {"timeout_s": args.qat_timeout, "tries": args.qat_tries,
+                       "retry_delay_s": args.qat_retry_delay, "metrics": server_metrics},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""识别内存基准：python benchmarks/memory.py [-n 3] [--size 3840x2160] [--image uploads/example.png] [--max-analysis-mb 400]
+
+把截图缩放到指定分辨率（默认 4K），分别在默认模式与低内存模式下，
+于新的子进程中连续识别 n 次（包括解码），记录识别前的常驻内存、每次识别期间的峰值常驻内存，
+以及识别带来的峰值增量（最后一次的峰值 - 识别前）。Linux 上每次识别前都会重置峰值，
+其他平台上为进程整个生命周期的峰值。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+
+_CHILD = r"""
+import glob, json, os, shutil
+import analyze
+from template_pack import get_template_pack
+from utils.memory import peak_rss_bytes, reset_peak_rss
+from utils.path import UPLOAD_DIR
+
+get_template_pack()
+reset = reset_peak_rss()
+baseline = peak_rss_bytes()
+peaks = []
+for i in range(RUNS):
+    shutil.copy(IMAGE_PATH, os.path.join(UPLOAD_DIR, f"membench_{i}.png"))
+    analyze.analyze(f"membench_{i}.png")
+    peaks.append(peak_rss_bytes())
+for path in glob.glob(os.path.join(UPLOAD_DIR, "*membench_*")):
+    os.remove(path)
+print(json.dumps({"baseline": baseline, "peaks": peaks, "reset": reset}))
+"""
+
+
+def run_mode(image_path, runs, low_memory):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, LOG_LEVEL="ERROR",
+               LOW_MEMORY="1" if low_memory else "0")
+    code = f"RUNS = {runs}\nIMAGE_PATH = {image_path!r}\n" + _CHILD
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    mib = 1024 * 1024
+    return {
+        # 为 False 时峰值无法重置，各次峰值均为子进程整个生命周期的峰值
+        "peak_reset": result["reset"],
+        "baseline_mb": result["baseline"] / mib,
+        "peak_mb": [p / mib for p in result["peaks"]],
+        "analysis_peak_mb": (result["peaks"][-1] - result["baseline"]) / mib,
+        # 首次识别之后峰值的增长（低内存模式下主要是常驻的复用缓冲区）
+        "growth_after_first_mb": (result["peaks"][-1] - result["peaks"][0]) / mib,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量识别大尺寸截图时的峰值内存")
+    parser.add_argument("-n", "--runs", type=int, default=3)
+    parser.add_argument("--size", default="3840x2160", help="缩放后的分辨率，宽x高")
+    parser.add_argument("--image", default=os.path.join(ROOT_DIR, "uploads", "example.png"))
+    parser.add_argument("--max-analysis-mb", type=float, default=None,
+                        help="低内存模式的 analysis_peak_mb 超过该值时返回非零退出码")
+    args = parser.parse_args()
+
+    import cv2
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    img = cv2.imread(args.image)
+    if img is None:
+        parser.error(f"无法读取图像: {args.image}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_path = os.path.join(tmp_dir, "screenshot.png")
+        cv2.imwrite(image_path, cv2.resize(img, (width, height), interpolation=cv2.INTER_NEAREST))
+        report = {
+            "size": f"{width}x{height}",
+            "runs": args.runs,
+            "default": run_mode(image_path, args.runs, False),
+            "low_memory": run_mode(image_path, args.runs, True),
+        }
+    print(json.dumps(report, indent=2))
+
+    limit = args.max_analysis_mb
+    if limit is not None and report["low_memory"]["analysis_peak_mb"] > limit:
+        print(f"低内存模式的识别峰值增量 {report['low_memory']['analysis_peak_mb']:.1f} MB "
+              f"超过 {limit} MB", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
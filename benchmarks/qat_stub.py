@@ -0,0 +1,109 @@
+"""本地 QAT 替身：python benchmarks/qat_stub.py [--port 8765] [--latency-ms 200] [--error-rate 0.05]
+
+按 QAT 的页面格式返回由查询字母随机拼成的单词，可配置延迟与错误率。
+将 QAT_URL 设为 http://127.0.0.1:<port>/cgi-bin/qat 即可让应用使用它。
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class QatStub:
+    """QAT 替身的配置与统计"""
+
+    def __init__(self, latency_ms=200.0, jitter_ms=0.0, error_rate=0.0,
+                 words_per_length=50, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.words_per_length = words_per_length
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def words(self, pat, dictionary):
+        """根据 "长度:*/字母" 模式生成单词，同一查询的结果总是相同"""
+        length, _, letters = pat.partition(":")
+        letters = letters.split("/")[-1].upper()
+        length = int(length)
+        if length > len(letters):
+            return length, []
+        rng = random.Random(f"{pat}|{dictionary}")
+        words = set()
+        for _ in range(self.words_per_length):
+            chosen = rng.sample(letters, length)
+            words.add("".join(c if c != "." else rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+                              for c in chosen))
+        return length, sorted(words)
+
+    def handle(self, query):
+        """返回 (状态码, 页面内容)"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay / 1000)
+        if failed:
+            return 500, "<html><body>Internal Server Error</body></html>"
+
+        params = parse_qs(query)
+        length, words = self.words(params.get("pat", ["5:*/"])[0],
+                                   params.get("dict", ["1"])[0])
+        body = f"<b>Length {length}</b><br>\n{' '.join(words)}<br>" if words else ""
+        return 200, f"<html><body>{body}</body></html>"
+
+
+def start_stub(stub, host="127.0.0.1", port=0):
+    """在后台线程中启动替身服务，返回 (服务器, QAT_URL)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/cgi-bin/qat":
+                self.send_error(404)
+                return
+            status, body = stub.handle(url.query)
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/cgi-bin/qat"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 QAT 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--words", type=int, default=50, help="每个长度返回的单词数")
+    args = parser.parse_args()
+
+    stub = QatStub(args.latency_ms, args.jitter_ms, args.error_rate, args.words)
+    server, url = start_stub(stub, args.host, args.port)
+    print(f"QAT 替身已启动: QAT_URL={url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
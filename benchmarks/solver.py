@@ -0,0 +1,253 @@
+"""求解器微基准：python benchmarks/solver.py [-r 5] [-o result.json] [--update-expected] [--record]
+
+使用 fixtures/solver_racks.json 中记录的牌面与 QAT 单词列表，完全离线运行。
+输出 gen_perms、fill_word、eval_word、solve_word 与 get_words 求解循环的耗时、
+每秒处理的候选摆放数、各函数的内存分配块数与峰值，并把求解结果与记录的期望结果比对。
+--update-expected 用当前实现重写期望结果；--record 从 QAT 重新录制单词列表（需要联网）。
+
+另外在较大的单词表（默认按字母频率随机生成 --search-words 个单词，或用 --dictionary 指定本地词典）上
+比较字典树搜索不限数量与只取前 --search-limit 名的耗时，检验剪枝是否生效；
+--min-pruning-speedup 指定总加速比的下限。
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+import trie_search  # noqa: E402
+import word  # noqa: E402
+from strategy import AVAILABLE_STRATEGIES, get_strategy  # noqa: E402
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "fixtures", "solver_racks.json")
+
+
+def _timeit(func, repeat):
+    """执行 repeat 次，返回 (中位数, 最小值) 毫秒，以及最后一次的返回值"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), min(times), result
+
+
+def _allocations(func):
+    """在 tracemalloc 下执行一次，统计调用结束时仍由结果持有的内存块数与大小，以及峰值"""
+    tracemalloc.start()
+    try:
+        result = func()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = snapshot.statistics("filename")
+    del result
+    return {
+        "blocks": sum(stat.count for stat in stats),
+        "kib": sum(stat.size for stat in stats) / 1024,
+        "peak_kib": peak / 1024,
+    }
+
+
+def _solve_inputs(rack):
+    letters = [tuple(l) for l in rack["letters"]]
+    results = {int(length): words for length, words in rack["words"].items()}
+    n_ex = sum(1 for l in letters if l[1] == '!')
+    return letters, results, n_ex
+
+
+def _ranked(final_results):
+    return [x['perm'] for x in sorted(final_results[0], key=lambda x: x['score'], reverse=True)]
+
+
+def bench_rack(rack, strategy, repeat):
+    letters, results, n_ex = _solve_inputs(rack)
+    max_length = rack["max_length"]
+    jobs = [(w, ex) for length, words in results.items()
+            for ex in range(min(n_ex, max_length - length) + 1) for w in words]
+
+    gen_ms, gen_min, perms = _timeit(
+        lambda: [p for w, ex in jobs for p in word.gen_perms(w, ex)], repeat)
+
+    def _fill_all():
+        filled = []
+        for p in perms:
+            try:
+                filled.append(word.fill_word(p, letters, strategy))
+            except ValueError:
+                pass
+        return filled
+    fill_ms, fill_min, filled = _timeit(_fill_all, repeat)
+
+    eval_ms, eval_min, _ = _timeit(
+        lambda: [word.eval_word(place, unused, strategy) for place, unused in filled], repeat)
+
+    solve_ms, solve_min, _ = _timeit(
+        lambda: [word._solve_word(w, letters, ex, strategy) for w, ex in jobs], repeat)
+
+    def _cold_loop():
+        word._solve_cache.clear()
+        return word._solve_all(results, letters, n_ex, max_length, strategy)
+    loop_ms, loop_min, final_results = _timeit(_cold_loop, repeat)
+    warm_ms, warm_min, _ = _timeit(
+        lambda: word._solve_all(results, letters, n_ex, max_length, strategy), repeat)
+
+    allocations = {
+        "gen_perms": _allocations(
+            lambda: [p for w, ex in jobs for p in word.gen_perms(w, ex)]),
+        "fill_word": _allocations(_fill_all),
+        "eval_word": _allocations(
+            lambda: [word.eval_word(place, unused, strategy) for place, unused in filled]),
+        "solve_word": _allocations(
+            lambda: [word._solve_word(w, letters, ex, strategy) for w, ex in jobs]),
+        "solve_loop_cold": _allocations(_cold_loop),
+    }
+
+    return {
+        "words": sum(len(w) for w in results.values()),
+        "jobs": len(jobs),
+        "candidates": len(perms),
+        "filled": len(filled),
+        "timings_ms": {
+            "gen_perms": {"median": gen_ms, "min": gen_min},
+            "fill_word": {"median": fill_ms, "min": fill_min},
+            "eval_word": {"median": eval_ms, "min": eval_min},
+            "solve_word": {"median": solve_ms, "min": solve_min},
+            "solve_loop_cold": {"median": loop_ms, "min": loop_min},
+            "solve_loop_warm": {"median": warm_ms, "min": warm_min},
+        },
+        "candidates_per_second": len(perms) / (solve_ms / 1000) if solve_ms else None,
+        "allocations": allocations,
+    }, _ranked(final_results)
+
+
+# 生成单词表使用的字母频率（近似英文）
+_LETTER_FREQUENCY = "EEEEEEEEEEEETTTTTTTTTAAAAAAAAOOOOOOOIIIIIIINNNNNNNSSSSSSRRRRRRHHHHHLLLLDDDDCCCUUUMMFFPPGGWWYYBVKXJQZ"
+_SEARCH_DICTIONARY = "__solver_benchmark__"
+
+
+def synthetic_words(count, seed=0):
+    """按字母频率随机生成的单词表，用于在较大的字典树上测量剪枝效果"""
+    rng = random.Random(seed)
+    return {''.join(rng.choice(_LETTER_FREQUENCY) for _ in range(rng.randint(3, 12)))
+            for _ in range(count)}
+
+
+def _scores(perms, letters, strategy):
+    return [word.eval_word(*word.fill_word(p, letters, strategy), strategy) for p in perms]
+
+
+def bench_search(rack, strategy, dictionary, limit):
+    """比较字典树搜索不限数量与只取前 limit 名的耗时，返回 (统计, 前 limit 名是否一致)"""
+    letters = [tuple(l) for l in rack["letters"]]
+    max_length = rack["max_length"]
+    full_ms, _, full = _timeit(lambda: trie_search.search_words(
+        dictionary, letters, max_length, strategy=strategy, limit=None), 1)
+    top_ms, _, top = _timeit(lambda: trie_search.search_words(
+        dictionary, letters, max_length, strategy=strategy, limit=limit), 1)
+    # 同分的摆放顺序可能不同，只比较分数
+    consistent = _scores(top, letters, strategy) == _scores(full[:limit], letters, strategy)
+    return {
+        "placements": len(full),
+        "full_ms": full_ms,
+        "top_ms": top_ms,
+        "speedup": full_ms / top_ms if top_ms else None,
+    }, consistent
+
+
+def record_words(fixture):
+    """按 get_words 的方式从 QAT 重新获取每个牌面的单词列表"""
+    for rack in fixture["racks"]:
+        pat = ''.join(l[1] for l in rack["letters"]).replace("*", ".").replace("!", "").lower()
+        words = {}
+        for length in range(rack["max_length"], 4, -1):
+            words[str(length)] = word.req_qat(f"{length}:*/{pat}").get(length, [])
+        rack["words"] = {k: words[k] for k in sorted(words, key=int) if words[k]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="求解器微基准")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="JSON 结果输出文件，默认输出到标准输出")
+    parser.add_argument("--fixture", default=FIXTURE_PATH)
+    parser.add_argument("--update-expected", action="store_true")
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--dictionary", help="用于字典树搜索的本地词典，默认使用随机生成的单词表")
+    parser.add_argument("--search-words", type=int, default=50000)
+    parser.add_argument("--search-limit", type=int, default=word.SEARCH_LIMIT or 100)
+    parser.add_argument("--min-pruning-speedup", type=float, default=None,
+                        help="字典树搜索的总加速比（不限数量 / 前 N 名）低于该值时返回非零退出码")
+    args = parser.parse_args()
+
+    with open(args.fixture, encoding="utf-8") as fp:
+        fixture = json.load(fp)
+    if args.record:
+        record_words(fixture)
+        args.update_expected = True
+
+    strategies = [name for name in AVAILABLE_STRATEGIES if get_strategy(name)["solve"]]
+    report = {"repeat": args.repeat, "racks": {}, "mismatches": []}
+    for rack in fixture["racks"]:
+        expected = rack.setdefault("expected", {})
+        for strategy in strategies:
+            stats, ranked = bench_rack(rack, strategy, args.repeat)
+            report["racks"].setdefault(rack["name"], {})[strategy] = stats
+            if args.update_expected:
+                expected[strategy] = ranked
+            elif expected.get(strategy) != ranked:
+                report["mismatches"].append(f"{rack['name']}/{strategy}")
+
+    dictionary = args.dictionary
+    if dictionary is None:
+        # 直接放入字典树缓存，不需要写出词典文件
+        dictionary = _SEARCH_DICTIONARY
+        trie_search._tries[dictionary] = trie_search.build_trie(synthetic_words(args.search_words))
+    search = {"dictionary": args.dictionary or f"synthetic:{args.search_words}",
+              "limit": args.search_limit, "racks": {}}
+    for rack in fixture["racks"]:
+        for strategy in strategies:
+            stats, consistent = bench_search(rack, strategy, dictionary, args.search_limit)
+            search["racks"].setdefault(rack["name"], {})[strategy] = stats
+            if not consistent:
+                report["mismatches"].append(f"search:{rack['name']}/{strategy}")
+    runs = [s for r in search["racks"].values() for s in r.values()]
+    top_ms = sum(s["top_ms"] for s in runs)
+    search["speedup"] = sum(s["full_ms"] for s in runs) / top_ms if top_ms else None
+    report["search"] = search
+
+    if args.update_expected:
+        with open(args.fixture, "w", encoding="utf-8") as fp:
+            json.dump(fixture, fp, indent=1)
+            fp.write("\n")
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            fp.write(output + "\n")
+    else:
+        print(output)
+
+    if report["mismatches"]:
+        print(f"求解结果与期望不一致: {report['mismatches']}", file=sys.stderr)
+        sys.exit(1)
+    if args.min_pruning_speedup is not None and search["speedup"] is not None and \
+            search["speedup"] < args.min_pruning_speedup:
+        print(f"字典树搜索的剪枝加速比 {search['speedup']:.2f} 低于 {args.min_pruning_speedup}",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
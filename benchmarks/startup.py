@@ -0,0 +1,79 @@
+"""启动耗时基准：python benchmarks/startup.py [-n 5] [--max-startup-ms 500]
+
+每轮在新的子进程中导入 flask_app、创建应用并请求 /api/strategies，
+记录各阶段耗时、后台预热完成的时间，以及创建应用后是否已导入重量级依赖。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+
+# 这些模块不应在启动阶段导入
+HEAVY_MODULES = ["cv2", "numpy", "requests", "bs4", "retry"]
+
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import flask_app
+t1 = time.perf_counter()
+app = flask_app.create_app(warm_up=False)
+t2 = time.perf_counter()
+app.test_client().get("/api/strategies")
+t3 = time.perf_counter()
+heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+import warmup
+warmup.start_warm_up()
+while not warmup.readiness()[0] and "failed" not in warmup.readiness()[1].values():
+    time.sleep(0.005)
+t4 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "create_app_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "startup_ms": (t3 - t0) * 1000,
+    "ready_ms": (t4 - t0) * 1000,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def run_once():
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, LOG_LEVEL="ERROR")
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + _CHILD
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量应用冷启动耗时")
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--max-startup-ms", type=float, default=None,
+                        help="startup_ms 的中位数超过该值时返回非零退出码")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    report = {key: statistics.median(r[key] for r in runs)
+              for key in ("import_ms", "create_app_ms", "first_request_ms",
+                          "startup_ms", "ready_ms")}
+    report["heavy_modules"] = sorted({m for r in runs for m in r["heavy_modules"]})
+    report["runs"] = args.runs
+    print(json.dumps(report, indent=2))
+
+    if report["heavy_modules"]:
+        print(f"启动阶段导入了重量级依赖: {report['heavy_modules']}", file=sys.stderr)
+        sys.exit(1)
+    if args.max_startup_ms is not None and report["startup_ms"] > args.max_startup_ms:
+        print(f"启动耗时 {report['startup_ms']:.1f} ms 超过 {args.max_startup_ms} ms",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
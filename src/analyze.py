@@ -1,10 +1,18 @@
+import hashlib
 import os
+import threading
+from contextlib import contextmanager
 
 import cv2
 import numpy as np
 
+from utils import metrics
+from utils.cache import LRUCache
+from template_pack import get_template_pack
 from utils.logger import get_logger
+from utils.memory import peak_rss_bytes, reset_peak_rss
 from utils.path import TEMPLATE_DIR, UPLOAD_DIR
+from utils.vision import TEMPLATE_SIZE, extract_black_part
 
 
 logger = get_logger(__name__)
@@ -19,81 +27,90 @@ CATEGORY_COLORS = {
     ]
 }
 
+# 字母放置区域数量的下限与上限（会话更新中客户端给出的 max_length 也须在此范围内）
+MIN_SLOTS = 9
+MAX_SLOTS = 16
+
+# 特征空间最近邻候选数量，只对这些候选计算精确的交并比；为 0 时与全部模板比较
+MATCH_CANDIDATES = int(os.getenv("MATCH_CANDIDATES", "8"))
+
+# 字母识别缓存：二值化字形指纹 -> 匹配结果
+_tile_cache = LRUCache("tile", maxsize=int(os.getenv("TILE_CACHE_SIZE", "4096")))
+
+# 低内存模式：整图掩码与连通域标签使用进程内复用的预分配缓冲区，调试图像直接画在原图上
+LOW_MEMORY = os.getenv("LOW_MEMORY", "0") == "1"
+# 空闲时最多保留的缓冲区组数（每组每像素 3 字节）
+BUFFER_POOL_SIZE = int(os.getenv("BUFFER_POOL_SIZE", "2"))
+
+
+class BufferPool:
+    """按图像尺寸复用的整图缓冲区，所有线程共享
+
+    每组为一个 uint8 掩码与一个 uint16 标签数组。识别期间借出，结束后归还；
+    空闲的组最多保留 maxsize 个，多出的按最久未用淘汰。
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._free = []  # [(尺寸, (掩码, 标签))]，最近归还的在末尾
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def borrow(self, height, width):
+        shape = (height, width)
+        buffers = None
+        with self._lock:
+            for i in range(len(self._free) - 1, -1, -1):
+                if self._free[i][0] == shape:
+                    buffers = self._free.pop(i)[1]
+                    break
+        if buffers is None:
+            buffers = (np.empty(shape, dtype=np.uint8), np.empty(shape, dtype=np.uint16))
+        try:
+            yield buffers
+        finally:
+            with self._lock:
+                self._free.append((shape, buffers))
+                del self._free[:max(0, len(self._free) - self.maxsize)]
+
+
+_buffers = BufferPool(BUFFER_POOL_SIZE)
+
+# 正在进行的识别数量，用于统计峰值内存
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def find_all_matches(region_img, category, candidates=None):
+    """在指定类别的模板中查找匹配结果
+
+    先在特征空间中取最近的 candidates 个模板，再逐个计算精确的交并比。
+    因此只返回这些候选（按交并比降序），不是该类别的全部模板；交并比排在前面
+    但特征距离较远的模板可能不在其中。candidates 为 0 时与全部模板比较并全部返回。
+    """
+    if candidates is None:
+        candidates = MATCH_CANDIDATES
+    pack = get_template_pack()
+    indices = pack.category_indices(category)
+
+    # 区域预处理（与模板相同），按位压缩后与模板逐个计算交并比
+    region_resized = cv2.resize(region_img, (pack.width, pack.height))
+    region_binary = extract_black_part(region_resized) > 0
+    if candidates > 0:
+        indices = pack.nearest(region_binary, indices, candidates)
+    region_bits = np.packbits(region_binary)
+    template_bits = pack.bits[indices]
+    intersection = np.bitwise_count(template_bits & region_bits).sum(axis=1)
+    union = np.bitwise_count(template_bits | region_bits).sum(axis=1)
 
-def extract_black_part(image):
-    """提取图像的黑色部分并二值化"""
-    if len(image.shape) > 2:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    # 提取黑色区域（0-10灰度值）
-    _, binary = cv2.threshold(image, 10, 255, cv2.THRESH_BINARY_INV)
-    return binary
-
-
-def calculate_similarity(img1, img2):
-    """计算两个二值图像的相似度（交并比）"""
-    # 确保图像为二值格式
-    if img1.max() > 1:
-        img1 = img1 / 255
-    if img2.max() > 1:
-        img2 = img2 / 255
-
-    intersection = np.logical_and(img1, img2).sum()
-    union = np.logical_or(img1, img2).sum()
-
-    if union == 0:
-        return 0.0
-    return float(intersection) / float(union)
-
-
-def match_region(region_img, template_path):
-    """匹配区域与模板，返回匹配得分和匹配字母"""
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-    if template is None:
-        logger.error(f"无法读取模板: {template_path}")
-        return 0, "?"
-
-    # 区域预处理
-    region_resized = cv2.resize(
-        region_img, (template.shape[1], template.shape[0]))
-    region_binary = extract_black_part(region_resized)
-
-    # 模板预处理
-    template_binary = extract_black_part(template)
-
-    # 计算相似度
-    similarity = calculate_similarity(region_binary, template_binary)
-    return similarity, os.path.basename(template_path)
-
-
-def find_all_matches(region_img, category):
-    """在指定类别的模板文件夹中查找所有匹配结果"""
-    template_folder = os.path.join(TEMPLATE_DIR, category)
     matches = []
-
-    for filename in os.listdir(template_folder):
-        if filename.startswith("."):
-            continue
-        file_path = os.path.join(template_folder, filename)
-        score, letter = match_region(region_img, file_path)
-
-        # 提取字母名称（移除前缀和后缀）
-        letter_name = letter.split('.')[0]
-        if '_' in letter_name:
-            font = letter_name.split('_')[0]
-            letter_name = letter_name.split('_')[-1]
-            if letter_name == "exclamation":
-                letter_name = "!"
-            elif letter_name == "wildcard":
-                letter_name = "*"
-        else:
-            font = "unknown"
-
+    for i, inter, uni in zip(indices, intersection, union):
+        entry = pack.templates[i]
         matches.append({
-            "template": filename,
-            "score": score,
-            "letter": letter_name,
-            "font": font
+            "template": entry["template"],
+            "score": float(inter) / float(uni) if uni else 0.0,
+            "letter": entry["letter"],
+            "font": entry["font"]
         })
 
     # 按相似度从高到低排序
@@ -101,11 +118,37 @@ def find_all_matches(region_img, category):
     return matches
 
 
-def get_mask(img, target_colors_rgb, tolerance=10):
-    """在图像中查找指定颜色区域并返回二值掩码（容差可调整）"""
+def tile_fingerprint(region_img, category):
+    """将区域缩放到模板尺寸并二值化，返回字形的哈希值（包含模板版本）"""
+    region_binary = extract_black_part(cv2.resize(region_img, TEMPLATE_SIZE))
+    digest = hashlib.blake2b(np.packbits(region_binary).tobytes(), digest_size=16)
+    digest.update(category.encode())
+    digest.update(get_template_pack().version.encode())
+    return digest.digest()
+
+
+def match_tile(region_img, category):
+    """带缓存的 find_all_matches，字形相同的区域直接返回上次的匹配结果"""
+    key = tile_fingerprint(region_img, category)
+    matches = _tile_cache.get(key)
+    if matches is None:
+        matches = find_all_matches(region_img, category)
+        _tile_cache.put(key, matches)
+    return [dict(m) for m in matches]
+
 
+def get_mask(img, target_colors_rgb, tolerance=10, out=None, scratch=None):
+    """在图像中查找指定颜色区域并返回二值掩码（容差可调整）
+
+    out 与 scratch 为与图像同尺寸的 uint8 数组，传入时掩码就地写入 out，不再分配新的整图数组。
+    """
     # 创建空白掩码
-    combined_mask = np.zeros(img.shape[:2], dtype=np.uint8)
+    if out is None:
+        out = np.empty(img.shape[:2], dtype=np.uint8)
+    if scratch is None:
+        scratch = np.empty(img.shape[:2], dtype=np.uint8)
+    combined_mask = out
+    combined_mask.fill(0)
 
     # 处理每个目标颜色
     for color_rgb in target_colors_rgb:
@@ -118,23 +161,40 @@ def get_mask(img, target_colors_rgb, tolerance=10):
         upper_color = np.clip(color_bgr + tolerance, 0, 255).astype(np.uint8)
         # print(f"处理颜色: {color_rgb} (BGR: {color_bgr.tolist()})，容差范围: {lower_color.tolist()} - {upper_color.tolist()}")
         # 创建颜色掩码
-        color_mask = cv2.inRange(img, lower_color, upper_color)
+        color_mask = cv2.inRange(img, lower_color, upper_color, dst=scratch)
 
         # 将当前颜色的掩码加入到组合掩码中
-        combined_mask = cv2.bitwise_or(combined_mask, color_mask)
+        cv2.bitwise_or(combined_mask, color_mask, dst=combined_mask)
 
-    # 形态学操作增强区域
+    # 形态学操作增强区域：先闭运算再开运算，拆成膨胀与腐蚀，在 out 与 scratch 之间来回写入
     kernel = np.ones((5, 5), np.uint8)
-    cleaned_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_CLOSE, kernel)
-    cleaned_mask = cv2.morphologyEx(cleaned_mask, cv2.MORPH_OPEN, kernel)
+    cv2.dilate(combined_mask, kernel, dst=scratch)
+    cv2.erode(scratch, kernel, dst=out)
+    cv2.erode(out, kernel, dst=scratch)
+    cleaned_mask = cv2.dilate(scratch, kernel, dst=out)
 
     return cleaned_mask
 
 
-def get_valid_regions(img, mask, min_area=0.001, ar=None, udlr=(0, 0, 0, 0)):
-    """从掩码中提取符合条件的区域"""
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
-        mask, connectivity=8)
+def get_valid_regions(img, mask, min_area=0.001, ar=None, udlr=(0, 0, 0, 0), labels=None):
+    """从掩码中提取符合条件的区域
+
+    labels 为可复用的 uint16 标签数组；连通域超过 65535 个时退回临时分配的 int32 标签
+    （每像素多 4 字节），并记录到 wordatro_label_buffer_fallbacks_total。
+    """
+    if labels is None:
+        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
+            mask, connectivity=8)
+    else:
+        try:
+            num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
+                mask, labels=labels, connectivity=8, ltype=cv2.CV_16U)
+        except cv2.error:
+            metrics.inc(metrics.LABEL_FALLBACKS)
+            logger.warning("连通域超过 65535 个，临时分配 %dx%d 的 int32 标签数组",
+                           mask.shape[1], mask.shape[0])
+            num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
+                mask, connectivity=8, ltype=cv2.CV_32S)
 
     valid_regions = []
     cur_label = 1
@@ -204,24 +264,77 @@ def analyze(filename: str):
     filepath = os.path.join(UPLOAD_DIR, filename)
 
     # 读取图像
-    img = cv2.imread(filepath)
-    if img is None:
-        logger.debug(f"无法读取图像: {filepath}")
-        return None
-
-    # 创建调试图像
-    debug_img = img.copy()
+    with _measure_peak_rss():
+        with metrics.timer("decode"):
+            img = cv2.imread(filepath)
+        if img is None:
+            logger.debug(f"无法读取图像: {filepath}")
+            return None
+
+        return analyze_image(img, filename)
+
+
+@contextmanager
+def _measure_peak_rss():
+    """统计识别期间的峰值常驻内存并导出到 metrics
+
+    只在没有其他识别进行时重置峰值，因此多个识别重叠时得到的是它们共同的峰值。
+    """
+    global _in_flight
+    with _in_flight_lock:
+        if _in_flight == 0:
+            metrics.set_gauge(metrics.PEAK_RSS_RESET, 1 if reset_peak_rss() else 0)
+        _in_flight += 1
+    try:
+        yield
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+        peak_rss = peak_rss_bytes()
+        if peak_rss is not None:
+            metrics.set_gauge(metrics.PEAK_RSS, peak_rss)
+
+
+def analyze_image(img, filename: str, low_memory=None):
+    """分析已解码的 BGR 图像，预览图与调试图像以 filename 为前缀写入上传目录
+
+    低内存模式（默认取 LOW_MEMORY）下从缓冲池借用整图缓冲区，并把调试标注直接画在 img 上。
+    """
+    if low_memory is None:
+        low_memory = LOW_MEMORY
+    if not low_memory:
+        return _analyze_image(img, filename, None, None)
+
+    height, width = img.shape[:2]
+    with _buffers.borrow(height, width) as (mask, labels):
+        return _analyze_image(img, filename, mask, labels)
+
+
+def _analyze_image(img, filename, mask_buffer, labels):
+    low_memory = mask_buffer is not None
+    buffers = {}
+    if low_memory:
+        height, width = img.shape[:2]
+        # 连通域标签与 get_mask 的中间结果不会同时使用，共用同一块缓冲区（每像素共 3 字节）
+        buffers = {
+            "out": mask_buffer,
+            "scratch": labels.reshape(-1).view(np.uint8)[:height * width].reshape(height, width),
+        }
+
+    # 调试标注：(区域, 颜色, 标签)，识别完成后统一绘制
+    annotations = []
     all_results = {}
 
     for category, colors in CATEGORY_COLORS.items():
         # 为该类别检测颜色区域
-        mask = get_mask(img, colors, tolerance=10)
-        regions = get_valid_regions(
-            img, mask, min_area=0.001, ar=(0.8, 1.2), udlr=(0.7, 0, 0, 0))
+        with metrics.timer("mask"):
+            mask = get_mask(img, colors, tolerance=10, **buffers)
+        with metrics.timer("regions"):
+            regions = get_valid_regions(
+                img, mask, min_area=0.001, ar=(0.8, 1.2), udlr=(0.7, 0, 0, 0), labels=labels)
         logger.info(f"{category} 检测到 {len(regions)} 个有效字母")
 
-        debug_img = annotate_image(
-            debug_img, regions, color=(0, 0, 255), label=category[:1])
+        annotations.append((list(regions), (0, 0, 255), category[:1]))
 
         # 按区域面积从大到小排序
         regions.sort(key=lambda r: r["bbox"][2]
@@ -238,10 +351,12 @@ def analyze(filename: str):
             preview_filename = f"{os.path.splitext(filename)[0]}_{category[:1]}{i+1}.png"
             preview_path = os.path.join(
                 UPLOAD_DIR, preview_filename)
-            cv2.imwrite(preview_path, region_img)
+            with metrics.timer("artifact_write"):
+                cv2.imwrite(preview_path, region_img)
 
             # 获取该区域所有匹配结果
-            matches = find_all_matches(region_img, category)
+            with metrics.timer("match"):
+                matches = match_tile(region_img, category)
 
             # 保存结果
             category_results.append({
@@ -265,29 +380,41 @@ def analyze(filename: str):
     else:
         logger.info(f"总共检测到 {total_regions} 个字母")
 
-    white_mask = get_mask(img, [(255, 255, 255)], tolerance=10)
-    white_regions = get_valid_regions(
-        img, white_mask, min_area=0.001, ar=(0.8, 1.2), udlr=(0.4, 0.3, 0.15, 0.15))
+    with metrics.timer("mask"):
+        white_mask = get_mask(img, [(255, 255, 255)], tolerance=10, **buffers)
+    with metrics.timer("regions"):
+        white_regions = get_valid_regions(
+            img, white_mask, min_area=0.001, ar=(0.8, 1.2), udlr=(0.4, 0.3, 0.15, 0.15),
+            labels=labels)
 
-    debug_img = annotate_image(
-        debug_img, white_regions, color=(255, 0, 0), label="W")
+    annotations.append((white_regions, (255, 0, 0), "W"))
 
     max_length = len(white_regions)
-    if max_length < 9:
+    if max_length < MIN_SLOTS:
+        logger.warning(
+            f"检测到的字母放置区域数量 ({max_length}) 少于 {MIN_SLOTS} 个，可能需要调整参数或检查图像质量。")
+        max_length = MIN_SLOTS
+    elif max_length > MAX_SLOTS:
         logger.warning(
-            f"检测到的字母放置区域数量 ({max_length}) 少于 9 个，可能需要调整参数或检查图像质量。")
-        max_length = 9
+            f"检测到的字母放置区域数量 ({max_length}) 多于 {MAX_SLOTS} 个，可能需要调整参数或检查图像质量。")
+        max_length = MAX_SLOTS
     else:
         logger.info(f"检测到 {max_length} 个有效字母放置区域")
 
+    # 创建调试图像（区域预览图已写出，低内存模式下可以直接在原图上标注）
+    debug_img = img if low_memory else img.copy()
+    for regions, color, label in annotations:
+        debug_img = annotate_image(debug_img, regions, color=color, label=label)
+
     # 保存调试图像
     debug_filename = f"debug_{filename}"
     debug_filepath = os.path.join(
         UPLOAD_DIR, debug_filename)
-    if os.path.exists(debug_filepath):
-        logger.debug(f"调试图像已存在，删除旧文件: {debug_filepath}")
-        os.remove(debug_filepath)
-    cv2.imwrite(debug_filepath, debug_img)
+    with metrics.timer("artifact_write"):
+        if os.path.exists(debug_filepath):
+            logger.debug("调试图像已存在，删除旧文件: %s", debug_filepath)
+            os.remove(debug_filepath)
+        cv2.imwrite(debug_filepath, debug_img)
 
     return {
         "original_image": filename,
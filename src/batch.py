@@ -0,0 +1,172 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from analyze import analyze
+from strategy import AVAILABLE_STRATEGIES
+from utils.logger import get_logger
+from utils.mime import ALLOWED_FILE_EXT
+from utils.path import UPLOAD_DIR
+from word import available_dictionaries, get_words, rack_key
+
+
+logger = get_logger(__name__)
+
+# 同时向 QAT 查询的牌面数量（每个牌面内部还会按长度并发）
+WORD_WORKERS = 2
+
+# Web 服务中所有批量请求共享的识别进程数
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def stage_file(data: bytes, ext: str) -> str:
+    """将图片写入上传目录，命名规则与 /upload/ 相同，返回文件名"""
+    filename = f"{hashlib.sha256(data).hexdigest()[:16]}{ext.lower()}"
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with open(os.path.join(UPLOAD_DIR, filename), "wb") as fp:
+        fp.write(data)
+    return filename
+
+
+def collect_inputs(paths):
+    """展开文件、目录与 zip 压缩包，逐个产出 (来源名, 图片数据, 扩展名)"""
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                yield from collect_inputs([os.path.join(path, name)])
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(ALLOWED_FILE_EXT):
+                        continue
+                    yield (f"{path}:{info.filename}", zf.read(info),
+                           os.path.splitext(info.filename)[1])
+        elif path.lower().endswith(ALLOWED_FILE_EXT):
+            with open(path, "rb") as fp:
+                yield path, fp.read(), os.path.splitext(path)[1]
+        else:
+            logger.warning("跳过不支持的文件: %s", path)
+
+
+def get_shared_pool():
+    """Web 服务使用的识别进程池，进程数上限为 BATCH_WORKERS
+
+    服务进程中有多个线程（请求线程、后台预热），fork 可能复制出被其他线程持有的锁，
+    因此子进程以 spawn 方式启动。子进程异常退出导致进程池损坏时会重新创建。
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        # 子进程异常退出后进程池不可再用，换一个新的
+        if _shared_pool is None or getattr(_shared_pool, "_broken", False):
+            _shared_pool = ProcessPoolExecutor(
+                max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _shared_pool
+
+
+def analyze_batch(filenames, dictionary="YAWL", strategy="bold97", workers=None, pool=None):
+    """并行分析上传目录中的多张截图，按完成顺序逐张产出结果
+
+    图像识别在进程池中执行（传入 pool 时使用该进程池，否则创建 workers 个进程）；
+    字母与字体完全相同的牌面只查询、求解一次。
+    """
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from analyze_batch(filenames, dictionary, strategy, pool=pool)
+        return
+
+    with ThreadPoolExecutor(max_workers=WORD_WORKERS) as word_pool:
+        analyze_futures = {pool.submit(analyze, f): f for f in filenames}
+        word_futures = {}
+        # 求解任务 -> 等待该结果的 (文件名, 识别结果)
+        waiting = {}
+
+        def _drain_done():
+            for future in list(waiting):
+                if not future.done():
+                    continue
+                for filename, analyze_result in waiting.pop(future):
+                    yield _build_result(filename, analyze_result, future)
+
+        try:
+            for future in as_completed(analyze_futures):
+                filename = analyze_futures[future]
+                try:
+                    analyze_result = future.result()
+                except Exception as e:
+                    logger.error("分析 %s 失败: %s", filename, e)
+                    analyze_result = None
+                if not analyze_result:
+                    yield {"original_image": filename, "error": "Analysis failed."}
+                    continue
+
+                key = rack_key(analyze_result)
+                if key not in word_futures:
+                    word_futures[key] = word_pool.submit(
+                        get_words, analyze_result, dictionary=dictionary, strategy=strategy)
+                waiting.setdefault(word_futures[key], []).append(
+                    (filename, analyze_result))
+                yield from _drain_done()
+
+            for future in as_completed(list(waiting)):
+                for filename, analyze_result in waiting.pop(future):
+                    yield _build_result(filename, analyze_result, future)
+        finally:
+            # 提前结束（如客户端断开）时取消尚未开始的识别，不占用共享进程池
+            for future in analyze_futures:
+                future.cancel()
+
+
+def _build_result(filename, analyze_result, words_future):
+    try:
+        words = words_future.result()
+    except Exception as e:
+        logger.error("求解 %s 失败: %s", filename, e)
+        return {"original_image": filename, "debug_info": analyze_result,
+                "error": "Solving failed."}
+    return {"original_image": filename, "debug_info": analyze_result, "words": words}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量分析 Wordatro 截图")
+    parser.add_argument("inputs", nargs="+", help="图片文件、目录或 zip 压缩包")
+    parser.add_argument("-d", "--dictionary", default="YAWL",
+                        choices=available_dictionaries())
+    parser.add_argument("-s", "--strategy", default="bold97",
+                        choices=AVAILABLE_STRATEGIES)
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="识别进程数，默认为 CPU 核数")
+    parser.add_argument("-o", "--output", help="结果输出文件（JSON Lines），默认输出到标准输出")
+    parser.add_argument("--full", action="store_true", help="输出完整的识别结果")
+    args = parser.parse_args()
+
+    sources = {}
+    for source, data, ext in collect_inputs(args.inputs):
+        sources.setdefault(stage_file(data, ext), []).append(source)
+    logger.info("共 %d 张截图（去重后 %d 张）",
+                sum(len(v) for v in sources.values()), len(sources))
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for result in analyze_batch(list(sources), args.dictionary, args.strategy, args.jobs):
+            if not args.full and "debug_info" in result:
+                result["debug_image"] = result.pop("debug_info")["debug_image"]
+            for source in sources[result["original_image"]]:
+                out.write(json.dumps({"source": source, **result},
+                                     ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
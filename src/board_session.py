@@ -0,0 +1,151 @@
+import copy
+import os
+import secrets
+import threading
+
+import cv2
+import numpy as np
+
+from analyze import CATEGORY_COLORS, MAX_SLOTS, MIN_SLOTS, match_tile
+from utils import metrics
+from utils.cache import LRUCache
+from utils.logger import get_logger
+from utils.path import UPLOAD_DIR
+
+
+logger = get_logger(__name__)
+
+# 会话只保存在当前进程内，超出数量时淘汰最久未使用的会话
+_sessions = LRUCache("board_session", maxsize=int(
+    os.getenv("SESSION_CACHE_SIZE", "256")))
+
+
+class BoardSession:
+    """一局游戏的棋盘状态：上一次的识别结果（区域位置、匹配结果与放置区域数量）"""
+
+    def __init__(self, session_id, board):
+        self.id = session_id
+        self.board = board
+        self.revision = 0
+        self.lock = threading.Lock()
+
+
+def create_session(analyze_result):
+    """以一次完整识别的结果创建会话，返回会话 ID"""
+    session_id = secrets.token_urlsafe(12)
+    _sessions.put(session_id, BoardSession(session_id, copy.deepcopy(analyze_result)))
+    return session_id
+
+
+def get_board(session_id):
+    """返回会话当前棋盘的副本，会话不存在时返回 None"""
+    session = _sessions.get(session_id)
+    if session is None:
+        return None
+    with session.lock:
+        return copy.deepcopy(session.board)
+
+
+def decode_tile(data: bytes):
+    """解码客户端上传的字母区域截图"""
+    with metrics.timer("decode"):
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Cannot decode tile image")
+    return img
+
+
+def _find_tile(board, tile_id):
+    for category, tiles in board["categories"].items():
+        for i, tile in enumerate(tiles):
+            if tile["id"] == tile_id:
+                return category, i
+    return None, None
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _check_bbox(bbox):
+    """区域位置须为 x、y、width、height 四个非负整数"""
+    if not isinstance(bbox, dict) or set(bbox) != {"x", "y", "width", "height"} \
+            or not all(_is_count(v) for v in bbox.values()):
+        raise ValueError(f"Invalid bbox: {bbox!r}")
+    return bbox
+
+
+def _next_id(tiles, category):
+    used = [int(t["id"].split("-")[-1]) for t in tiles if t["id"].split("-")[-1].isdigit()]
+    return f"{category[:1]}-{max(used, default=0) + 1}"
+
+
+def _recognize(session, tile, category, data):
+    """重新识别单个区域并写入预览图"""
+    region_img = decode_tile(data)
+    preview_filename = f"{os.path.splitext(session.board['original_image'])[0]}" \
+        f"_r{session.revision}_{tile['id']}.png"
+    with metrics.timer("artifact_write"):
+        cv2.imwrite(os.path.join(UPLOAD_DIR, preview_filename), region_img)
+    with metrics.timer("match"):
+        tile["matches"] = match_tile(region_img, category)
+    tile["preview"] = preview_filename
+
+
+def update_tiles(session_id, changes, files, max_length=None):
+    """将客户端发来的区域变化应用到会话棋盘，只重新识别变化的区域
+
+    changes 中每项为以下之一：
+    - {"id": "R-1", "removed": true}：该区域已不存在
+    - {"id": "R-1", "file": "<文件字段>"[, "bbox": {...}]}：用新截图重新识别已有区域
+    - {"category": "Regular", "file": "<文件字段>", "bbox": {...}}：新增区域
+    files 为文件字段名到图片数据的映射。max_length 须在 MIN_SLOTS 与 MAX_SLOTS 之间。
+    会话不存在时返回 None，变化不合法时抛出 ValueError。
+    """
+    if max_length is not None and not (_is_count(max_length)
+                                       and MIN_SLOTS <= max_length <= MAX_SLOTS):
+        raise ValueError(f"max_length must be between {MIN_SLOTS} and {MAX_SLOTS}")
+
+    session = _sessions.get(session_id)
+    if session is None:
+        return None
+
+    with session.lock:
+        board = copy.deepcopy(session.board)
+        session.revision += 1
+        for change in changes:
+            if not isinstance(change, dict):
+                raise ValueError(f"Invalid tile change: {change!r}")
+            tile_id = change.get("id")
+            if tile_id is not None:
+                category, index = _find_tile(board, tile_id)
+                if category is None:
+                    raise ValueError(f"Unknown tile: {tile_id}")
+                if change.get("removed"):
+                    del board["categories"][category][index]
+                    continue
+                tile = board["categories"][category][index]
+            else:
+                category = change.get("category")
+                if category not in CATEGORY_COLORS:
+                    raise ValueError(f"Unknown category: {category}")
+                tiles = board["categories"].setdefault(category, [])
+                tile = {"id": _next_id(tiles, category), "bbox": None,
+                        "preview": None, "matches": []}
+                tiles.append(tile)
+
+            if "bbox" in change:
+                tile["bbox"] = _check_bbox(change["bbox"])
+            field = change.get("file")
+            if field is None and tile_id is None:
+                raise ValueError("New tiles need an image")
+            if field is not None:
+                if field not in files:
+                    raise ValueError(f"Missing tile image: {field}")
+                _recognize(session, tile, category, files[field])
+
+        if max_length is not None:
+            board["max_length"] = max_length
+        session.board = board
+        logger.info("会话 %s 更新了 %d 个区域", session_id, len(changes))
+        return copy.deepcopy(board)
@@ -3,11 +3,13 @@ from flask import Flask, abort, redirect, send_from_directory
 from flask_cors import CORS
 
 import routes
+import warmup
 from utils.mime import ALLOWED_FILE_EXT
 from utils.path import ASSETS_DIR, FRONTEND_DIR, TEMPLATE_DIR, UPLOAD_DIR
 
 
-def create_app():
+def create_app(warm_up=True):
+    """创建 Flask 应用；warm_up 为 True 时在后台预热识别与查询所需的子系统"""
     app = Flask(__name__)
 
     os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -42,7 +44,20 @@ def create_app():
     def default_handler(*args, **kvargs):
         return send_from_directory(FRONTEND_DIR, "index.html")
 
+    if warm_up:
+        warmup.start_warm_up()
+
     return app
 
 
-flask_app = create_app()
+_flask_app = None
+
+
+def __getattr__(name):
+    # 兼容 flask_app.flask_app，仅在第一次访问时创建应用
+    global _flask_app
+    if name == "flask_app":
+        if _flask_app is None:
+            _flask_app = create_app()
+        return _flask_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
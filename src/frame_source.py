@@ -0,0 +1,70 @@
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+from utils.logger import get_logger
+from utils.mime import ALLOWED_FILE_EXT
+
+
+logger = get_logger(__name__)
+
+
+class FrameSource(ABC):
+    """帧来源基类，read() 返回 BGR 图像，没有更多帧时返回 None"""
+
+    @abstractmethod
+    def read(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DirectorySource(FrameSource):
+    """按文件名顺序回放目录中的截图，可用于在任意平台上复现或测试"""
+
+    def __init__(self, directory: str, loop: bool = False):
+        self.paths = [os.path.join(directory, name)
+                      for name in sorted(os.listdir(directory))
+                      if name.lower().endswith(ALLOWED_FILE_EXT)]
+        self.loop = loop
+        self.index = 0
+        logger.info("从 %s 回放 %d 帧", directory, len(self.paths))
+
+    def read(self):
+        while self.paths:
+            if self.index >= len(self.paths):
+                if not self.loop:
+                    return None
+                self.index = 0
+            path = self.paths[self.index]
+            img = cv2.imread(path)
+            if img is not None:
+                self.index += 1
+                return img
+            # 读取失败的文件不再回放，全部失败时结束而不是无限循环
+            logger.warning("无法读取图像，跳过: %s", path)
+            del self.paths[self.index]
+        return None
+
+
+class WindowSource(FrameSource):
+    """通过 Win32 GDI 截取游戏窗口客户区（仅 Windows）"""
+
+    def __init__(self, window_title: str = "Wordatro!"):
+        import capture  # 依赖 pywin32，仅在使用时导入
+
+        self._capture = capture
+        _, self.rect = capture.get_window_rect(window_title)
+
+    def read(self):
+        pil_img = self._capture.capture_screen_region(self.rect)
+        return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
@@ -5,4 +5,4 @@ if __name__ == "__main__":
     # Fix
     mimetypes.add_type("application/javascript", ".js", strict=True)
     mimetypes.add_type("application/json", ".json", strict=True)
-    flask_app.flask_app.run(host="0.0.0.0", port=5000)
+    flask_app.create_app().run(host="0.0.0.0", port=5000)
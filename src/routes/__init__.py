@@ -1,6 +1,6 @@
 from flask import Blueprint
 
-from routes import file_upload, analyze
+from routes import file_upload, analyze, metrics, status
 
 api_bp = Blueprint('api', __name__, url_prefix="/api")
 root_bp = Blueprint("root", __name__, url_prefix="/")
@@ -10,3 +10,5 @@ api_bp.register_blueprint(file_upload.api_bp)
 root_bp.register_blueprint(file_upload.root_bp)
 
 api_bp.register_blueprint(analyze.analyze_bp)
+api_bp.register_blueprint(metrics.metrics_bp)
+api_bp.register_blueprint(status.status_bp)
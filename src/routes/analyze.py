@@ -1,22 +1,20 @@
 import json
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, stream_with_context
 
-from analyze import analyze
-from utils import response
+from strategy import AVAILABLE_STRATEGIES
+from utils import metrics, response
 from utils.logger import get_logger
-from word import QAT_DICTIONARIES, get_words
+from word import available_dictionaries, get_words
 
 
 analyze_bp = Blueprint("analyze", __name__)
 
 logger = get_logger(__name__)
 
-AVAILABLE_STRATEGIES = ["none", "bold97", "bold975"]
-
 
 @analyze_bp.get("/dictionaries")
 def get_dictionaries():
-    return response.build_response({"dictionaries": QAT_DICTIONARIES})
+    return response.build_response({"dictionaries": available_dictionaries()})
 
 
 @analyze_bp.get("/strategies")
@@ -24,32 +22,49 @@ def get_strategies():
     return response.build_response({"strategies": AVAILABLE_STRATEGIES})
 
 
-@analyze_bp.post("/analyze")
-def analyze_file():
+def _parse_request(json_str=None):
+    """解析请求 JSON（默认为请求体）并校验词典与策略，失败时返回 None"""
     try:
-        json_str = request.get_data(as_text=True)
+        if json_str is None:
+            json_str = request.get_data(as_text=True)
         json_obj = json.loads(json_str)
+        if not isinstance(json_obj, dict):
+            raise ValueError("JSON object expected")
     except:
         logger.debug(f"Failed to parse JSON.")
-        return response.INVALID_PARAMETER_RESPONSE
+        return None
 
     dictionary = json_obj.get("dictionary", "YAWL")
-    if dictionary not in QAT_DICTIONARIES:
+    dictionaries = available_dictionaries()
+    if dictionary not in dictionaries:
         logger.debug(
-            f"Invalid dictionary: {dictionary}. Supported dictionaries: {QAT_DICTIONARIES}")
-        return response.INVALID_PARAMETER_RESPONSE
+            f"Invalid dictionary: {dictionary}. Supported dictionaries: {dictionaries}")
+        return None
 
     strategy = json_obj.get("strategy", "bold97")
     if strategy not in AVAILABLE_STRATEGIES:
         logger.debug(
             f"Invalid strategy: {strategy}. Supported strategies: {AVAILABLE_STRATEGIES}")
+        return None
+
+    return json_obj, dictionary, strategy
+
+
+@analyze_bp.post("/analyze")
+def analyze_file():
+    parsed = _parse_request()
+    if parsed is None:
         return response.INVALID_PARAMETER_RESPONSE
+    json_obj, dictionary, strategy = parsed
 
     filename = json_obj.get("filename")
     if not filename:
         logger.debug(f"Filename not found in JSON.")
         return response.INVALID_PARAMETER_RESPONSE
 
+    # OpenCV 与 NumPy 在第一次分析时才导入（或由后台预热提前导入）
+    from analyze import analyze
+
     analyze_result = analyze(filename)
 
     logger.debug(analyze_result)
@@ -58,10 +73,108 @@ def analyze_file():
         logger.debug(f"Analysis failed for file: {filename}")
         return response.build_error_response(error_message="Analysis failed. Please check the file and try again.")
 
+    return _solve_response(analyze_result, dictionary, strategy)
+
+
+def _solve_response(analyze_result, dictionary, strategy, **extra):
+    """求解识别结果并构造 /analyze 格式的响应，extra 中的字段一并返回"""
     words_result = get_words(
         analyze_result, dictionary=dictionary, strategy=strategy)
 
-    return response.build_response({"original_image": filename, "debug_info": analyze_result, "words": words_result, "options": {
-        "dictionary": dictionary,
-        "strategy": strategy
-    }})
+    with metrics.timer("serialize"):
+        return response.build_response({"original_image": analyze_result["original_image"], "debug_info": analyze_result, "words": words_result, "options": {
+            "dictionary": dictionary,
+            "strategy": strategy
+        }, **extra})
+
+
+@analyze_bp.post("/analyze/session")
+def analyze_session():
+    """完整分析一张截图并创建会话，之后的回合可只发送变化的区域"""
+    parsed = _parse_request()
+    if parsed is None:
+        return response.INVALID_PARAMETER_RESPONSE
+    json_obj, dictionary, strategy = parsed
+
+    filename = json_obj.get("filename")
+    if not filename:
+        logger.debug(f"Filename not found in JSON.")
+        return response.INVALID_PARAMETER_RESPONSE
+
+    from analyze import analyze
+    from board_session import create_session
+
+    analyze_result = analyze(filename)
+    if not analyze_result:
+        logger.debug(f"Analysis failed for file: {filename}")
+        return response.build_error_response(error_message="Analysis failed. Please check the file and try again.")
+
+    session_id = create_session(analyze_result)
+    return _solve_response(analyze_result, dictionary, strategy, session_id=session_id)
+
+
+@analyze_bp.post("/analyze/session/<session_id>")
+def update_session_tiles(session_id: str):
+    """应用区域变化后重新求解
+
+    请求为 JSON，或 multipart 表单（JSON 放在 data 字段，区域截图作为文件字段）。
+    JSON 中 tiles 为区域变化列表（格式见 board_session.update_tiles），max_length 可选。
+    """
+    if request.mimetype == "multipart/form-data":
+        parsed = _parse_request(request.form.get("data", "{}"))
+    else:
+        parsed = _parse_request()
+    if parsed is None:
+        return response.INVALID_PARAMETER_RESPONSE
+    json_obj, dictionary, strategy = parsed
+
+    changes = json_obj.get("tiles", [])
+    if not isinstance(changes, list):
+        logger.debug(f"Invalid tile changes: {changes}")
+        return response.INVALID_PARAMETER_RESPONSE, 400
+
+    from board_session import update_tiles
+
+    files = {name: f.read() for name, f in request.files.items()}
+    try:
+        board = update_tiles(session_id, changes, files,
+                             max_length=json_obj.get("max_length"))
+    except ValueError as e:
+        logger.debug(f"Invalid tile changes for session {session_id}: {e}")
+        return response.build_error_response(error_message=str(e)), 400
+    if board is None:
+        return response.SESSION_NOT_FOUND_RESPONSE
+
+    return _solve_response(board, dictionary, strategy, session_id=session_id)
+
+
+@analyze_bp.post("/analyze/batch")
+def analyze_files():
+    parsed = _parse_request()
+    if parsed is None:
+        return response.INVALID_PARAMETER_RESPONSE
+    json_obj, dictionary, strategy = parsed
+
+    filenames = json_obj.get("filenames")
+    if not isinstance(filenames, list) or not filenames or \
+            not all(isinstance(f, str) and f for f in filenames):
+        logger.debug(f"Filenames not found in JSON.")
+        return response.INVALID_PARAMETER_RESPONSE
+
+    options = {"dictionary": dictionary, "strategy": strategy}
+    from batch import analyze_batch, get_shared_pool
+
+    def _generate():
+        # 每行一个 JSON 对象，按分析完成顺序返回
+        for result in analyze_batch(list(dict.fromkeys(filenames)), dictionary, strategy,
+                                    pool=get_shared_pool()):
+            if "error" in result:
+                line = response.build_response(
+                    {"original_image": result["original_image"]},
+                    ret_code=-1, error_message=result["error"])
+            else:
+                line = response.build_response(
+                    {**result, "options": options})
+            yield line + "\n"
+
+    return Response(stream_with_context(_generate()), mimetype="application/x-ndjson")
@@ -0,0 +1,12 @@
+from flask import Blueprint, Response
+
+from utils import metrics
+
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.get("/metrics")
+def get_metrics():
+    return Response(metrics.render_prometheus(),
+                    mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,13 @@
+from flask import Blueprint
+
+import warmup
+from utils import response
+
+
+status_bp = Blueprint("status", __name__)
+
+
+@status_bp.get("/ready")
+def get_ready():
+    ready, components = warmup.readiness()
+    return response.build_response({"ready": ready, "components": components}), 200 if ready else 503
@@ -0,0 +1,136 @@
+from functools import lru_cache
+
+# 字体优先级
+BOLD_FIRST = ('bold', 'underscore', 'italic', 'special', 'regular')
+UNDERSCORE_FIRST = ('underscore', 'italic', 'special', 'regular', 'bold')
+ITALIC_FIRST = ('italic', 'underscore', 'special', 'regular', 'bold')
+
+# 各位置的加分（n 为单词长度，i 为位置）
+_UNDERSCORE_WEIGHT = (lambda n, i: 2 ** i)
+_ITALIC_WEIGHT = (lambda n, i: n - i)
+
+_BOLD_BASE = {
+    "solve": True,
+    "min_length": 5,
+    # 加粗位置使用的字体优先级
+    "bold_fonts": BOLD_FIRST,
+    # 其余位置的字体优先级：(起始位置, 优先级)，取第一个满足 位置 >= 起始位置 的项
+    "slot_fonts": ((4, UNDERSCORE_FIRST), (0, ITALIC_FIRST)),
+    # 剩余牌的加分
+    "unused_tile_weights": {('special', '*'): 10 ** 6, ('special', '!'): 10 ** 5},
+    "unused_font_weights": {'bold': 10 ** 4},
+    # 已放置字体在各位置的加分
+    "font_weights": {'underscore': _UNDERSCORE_WEIGHT, 'italic': _ITALIC_WEIGHT},
+    "letter_score_weight": 1e-2,
+    "filler_weight": 1e-4,
+}
+
+# 策略声明。tiers 中每项为 (最短长度, 加粗位置, 分值)：
+# 单词长度达到最短长度时加分，加粗位置放置的是粗体时再加一次
+STRATEGIES = {
+    "none": {"solve": False, "min_length": 1},
+    "bold97": {
+        **_BOLD_BASE,
+        "tiers": ((9, 8, 10 ** 9), (7, 6, 10 ** 8)),
+    },
+    "bold975": {
+        **_BOLD_BASE,
+        "tiers": ((9, 8, 10 ** 9), (7, 6, 10 ** 8), (5, 4, 10 ** 7)),
+    },
+}
+
+AVAILABLE_STRATEGIES = list(STRATEGIES)
+
+# 字母分值，eval_word 计分与 score_upper_bounds 估算上限共用
+LETTER_SCORE = {
+    'A': 1, 'B': 3, 'C': 3, 'D': 2, 'E': 1,
+    'F': 4, 'G': 2, 'H': 4, 'I': 1, 'J': 8,
+    'K': 5, 'L': 1, 'M': 3, 'N': 1, 'O': 1,
+    'P': 3, 'Q': 10, 'R': 1, 'S': 1, 'T': 1,
+    'U': 1, 'V': 4, 'W': 4, 'X': 8, 'Y': 4,
+    'Z': 10, '*': 10, '!': 10,
+}
+
+# 字母分值上限，score_upper_bounds 用它保证上限不低于实际得分
+MAX_LETTER_SCORE = max(LETTER_SCORE.values())
+
+
+def get_strategy(name):
+    """获取策略声明"""
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {name}")
+    return STRATEGIES[name]
+
+
+class StrategyTable:
+    """某一策略在固定单词长度下编译出的查找表"""
+    __slots__ = ("length", "fill_order", "base_score", "bold_bonus",
+                 "unused_tile_weights", "unused_font_weights", "font_weights",
+                 "letter_score_weight", "filler_weights", "filler_weight")
+
+    def __init__(self, spec, length):
+        n = length
+        tiers = [t for t in spec["tiers"] if n >= t[0]]
+        bold_slots = [slot for _, slot, _ in spec["tiers"] if slot < n]
+
+        self.length = n
+        # 填充顺序：先填加粗位置，再从右到左填其余位置
+        fill_order = [(i, spec["bold_fonts"]) for i in bold_slots]
+        for i in range(n - 1, -1, -1):
+            if i in bold_slots:
+                continue
+            order = next(o for start, o in spec["slot_fonts"] if i >= start)
+            fill_order.append((i, order))
+        self.fill_order = tuple(fill_order)
+
+        self.base_score = sum(weight for _, _, weight in tiers)
+        self.bold_bonus = tuple((slot, weight) for _, slot, weight in tiers)
+        self.unused_tile_weights = tuple(spec["unused_tile_weights"].items())
+        self.unused_font_weights = dict(spec["unused_font_weights"])
+        self.font_weights = {font: tuple(f(n, i) for i in range(n))
+                             for font, f in spec["font_weights"].items()}
+        self.letter_score_weight = spec["letter_score_weight"]
+        self.filler_weights = tuple(n - i for i in range(n))
+        self.filler_weight = spec["filler_weight"]
+
+
+@lru_cache(maxsize=None)
+def compile_strategy(name, length):
+    """将策略编译为指定单词长度的查找表（结果会被缓存）"""
+    spec = get_strategy(name)
+    if not spec["solve"]:
+        raise ValueError(f"Strategy '{name}' does not place words")
+    return StrategyTable(spec, length)
+
+
+def score_upper_bounds(name, letters, max_length, lost_slots=()):
+    """用这组牌摆出总长度不超过 n 的任意单词所能得到的分数上限，返回以 n 为下标的列表
+
+    lost_slots 为已确定放不了粗体牌的加粗位置，这些位置的加分不计入上限。
+    """
+    bounds = [0.0]
+    for n in range(1, max_length + 1):
+        table = compile_strategy(name, n)
+        tile_weights = dict(table.unused_tile_weights)
+        bound = table.base_score + sum(w for slot, w in table.bold_bonus
+                                       if slot not in lost_slots)
+        for tile in letters:
+            bound += tile_weights.get(tile, 0)
+            bound += table.unused_font_weights.get(tile[0], 0)
+        bound += sum(max((w[i] for w in table.font_weights.values()), default=0)
+                     for i in range(n))
+        bound += MAX_LETTER_SCORE * n * table.letter_score_weight
+        bound += sum(table.filler_weights) * table.filler_weight
+        # 总长度越长上限越高，取前缀最大值保证单调
+        bounds.append(max(bound, bounds[-1]))
+    return bounds
+
+
+def unused_tile_value(name, tile, max_length):
+    """牌留在手中时 score_upper_bounds 为它计入的最小加分；摆放中用掉这张牌时上限至少减少这么多"""
+    values = []
+    for n in range(1, max_length + 1):
+        table = compile_strategy(name, n)
+        values.append(dict(table.unused_tile_weights).get(tile, 0)
+                      + table.unused_font_weights.get(tile[0], 0))
+    return min(values, default=0)
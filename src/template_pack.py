@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.path import TEMPLATE_DIR, TEMPLATE_PACK_PATH
+
+
+logger = get_logger(__name__)
+
+# 文件格式：魔数 | 格式版本 | 索引长度 | JSON 索引 | 对齐填充 | 按位压缩的字形数据
+PACK_MAGIC = b"WTPK"
+PACK_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+_ALIGN = 64
+# 特征向量的网格边长：字形被划分为 FEATURE_GRID x FEATURE_GRID 个区块，取各区块的黑色像素占比
+FEATURE_GRID = 16
+
+
+def parse_template_name(filename):
+    """从模板文件名（如 bold_A.bmp）解析出字体与字母"""
+    letter_name = filename.split('.')[0]
+    if '_' in letter_name:
+        font = letter_name.split('_')[0]
+        letter_name = letter_name.split('_')[-1]
+        if letter_name == "exclamation":
+            letter_name = "!"
+        elif letter_name == "wildcard":
+            letter_name = "*"
+    else:
+        font = "unknown"
+    return font, letter_name
+
+
+def glyph_features(binary, grid=FEATURE_GRID):
+    """将二值字形（..., 高, 宽）降采样为区块占比特征向量（..., grid * grid）"""
+    *batch, height, width = binary.shape
+    zones = binary.reshape(*batch, grid, height // grid, grid, width // grid)
+    return zones.mean(axis=(-3, -1), dtype=np.float32).reshape(*batch, grid * grid)
+
+
+class TemplatePack:
+    """按类别组织的二值化模板字形，每行是一个模板按位压缩后的数据"""
+
+    def __init__(self, index, bits):
+        self.width = index["width"]
+        self.height = index["height"]
+        self.version = index["version"]
+        self.templates = index["templates"]
+        self.bits = bits
+        self._categories = {}
+        for i, entry in enumerate(self.templates):
+            self._categories.setdefault(entry["category"].lower(), []).append(i)
+        self._categories = {k: np.array(v) for k, v in self._categories.items()}
+        self._features = None
+
+    def category_indices(self, category):
+        """返回该类别的模板行号（类别名不区分大小写）"""
+        return self._categories.get(category.lower(), np.array([], dtype=int))
+
+    @property
+    def features(self):
+        """所有模板的特征向量，首次访问时计算"""
+        if self._features is None:
+            glyphs = np.unpackbits(np.asarray(self.bits), axis=1)
+            glyphs = glyphs.reshape(len(self.templates), self.height, self.width)
+            self._features = glyph_features(glyphs)
+        return self._features
+
+    def nearest(self, binary, indices, k):
+        """在 indices 指定的模板中，返回特征空间里与字形最近的 k 个模板行号"""
+        if len(indices) <= k:
+            return indices
+        distances = ((self.features[indices] - glyph_features(binary)) ** 2).sum(axis=1)
+        return indices[np.argpartition(distances, k - 1)[:k]]
+
+
+def _compute_version(templates, bits):
+    digest = hashlib.sha256(json.dumps(templates, sort_keys=True).encode())
+    digest.update(np.ascontiguousarray(bits).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _list_templates(template_dir):
+    """按 (类别, 文件名, 路径) 列出模板目录下的所有模板图片"""
+    for category in sorted(os.listdir(template_dir)):
+        category_dir = os.path.join(template_dir, category)
+        if category.startswith(".") or not os.path.isdir(category_dir):
+            continue
+        for filename in sorted(os.listdir(category_dir)):
+            if not filename.startswith("."):
+                yield category, filename, os.path.join(category_dir, filename)
+
+
+def compile_templates(template_dir=TEMPLATE_DIR):
+    """读取模板目录下的所有图片，二值化、缩放并按位压缩"""
+    import cv2
+    from utils.vision import TEMPLATE_SIZE, extract_black_part
+
+    templates = []
+    rows = []
+    for category, filename, path in _list_templates(template_dir):
+        template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if template is None:
+            logger.error("无法读取模板: %s", path)
+            continue
+        if (template.shape[1], template.shape[0]) != TEMPLATE_SIZE:
+            template = cv2.resize(template, TEMPLATE_SIZE)
+        font, letter = parse_template_name(filename)
+        templates.append({"category": category, "template": filename,
+                          "font": font, "letter": letter})
+        rows.append(np.packbits(extract_black_part(template) > 0))
+
+    bits = np.stack(rows) if rows else np.zeros(
+        (0, TEMPLATE_SIZE[0] * TEMPLATE_SIZE[1] // 8), dtype=np.uint8)
+    index = {
+        "width": TEMPLATE_SIZE[0],
+        "height": TEMPLATE_SIZE[1],
+        "version": _compute_version(templates, bits),
+        "templates": templates,
+    }
+    return TemplatePack(index, bits)
+
+
+def write_pack(pack, path=TEMPLATE_PACK_PATH):
+    index = json.dumps({
+        "width": pack.width,
+        "height": pack.height,
+        "version": pack.version,
+        "templates": pack.templates,
+    }, ensure_ascii=False).encode()
+    offset = _HEADER.size + len(index)
+    padding = (-offset) % _ALIGN
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fp:
+        fp.write(_HEADER.pack(PACK_MAGIC, PACK_FORMAT_VERSION, len(index)))
+        fp.write(index)
+        fp.write(b"\0" * padding)
+        fp.write(np.ascontiguousarray(pack.bits, dtype=np.uint8).tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_pack(path=TEMPLATE_PACK_PATH):
+    """以内存映射方式打开模板包，多个进程共享同一份页缓存"""
+    with open(path, "rb") as fp:
+        magic, format_version, index_len = _HEADER.unpack(fp.read(_HEADER.size))
+        if magic != PACK_MAGIC or format_version != PACK_FORMAT_VERSION:
+            raise ValueError(f"Unsupported template pack: {path}")
+        index = json.loads(fp.read(index_len))
+
+    offset = _HEADER.size + index_len
+    offset += (-offset) % _ALIGN
+    row_bytes = index["width"] * index["height"] // 8
+    count = len(index["templates"])
+    if count == 0:
+        bits = np.zeros((0, row_bytes), dtype=np.uint8)
+    else:
+        bits = np.memmap(path, dtype=np.uint8, mode="r",
+                         offset=offset, shape=(count, row_bytes))
+    return TemplatePack(index, bits)
+
+
+def _pack_is_stale(pack, path, template_dir):
+    """模板被修改、新增或删除后模板包即过期"""
+    pack_mtime = os.path.getmtime(path)
+    for root, _, files in os.walk(template_dir):
+        for filename in files:
+            file_path = os.path.join(root, filename)
+            if file_path != path and os.path.getmtime(file_path) > pack_mtime:
+                return True
+    # 删除或新增模板不会留下更新的修改时间，需与索引中的模板逐一比对
+    names = {(entry["category"], entry["template"]) for entry in pack.templates}
+    return names != {(c, f) for c, f, _ in _list_templates(template_dir)}
+
+
+_pack = None
+_pack_lock = threading.Lock()
+
+
+def get_template_pack():
+    """获取当前进程的模板包；模板包不存在或已过期时从模板目录即时编译"""
+    global _pack
+    if _pack is not None:
+        return _pack
+    # 预热线程与首个请求可能同时到达，只加载或编译一次
+    with _pack_lock:
+        if _pack is None:
+            pack = None
+            if os.path.exists(TEMPLATE_PACK_PATH):
+                pack = load_pack(TEMPLATE_PACK_PATH)
+                if _pack_is_stale(pack, TEMPLATE_PACK_PATH, TEMPLATE_DIR):
+                    pack = None
+            if pack is None:
+                logger.warning("模板包不存在或已过期，从 %s 即时编译；"
+                               "可执行 python src/template_pack.py 预先生成", TEMPLATE_DIR)
+                pack = compile_templates(TEMPLATE_DIR)
+            _pack = pack
+    return _pack
+
+
+def template_version():
+    """模板集合的版本哈希，可作为其他缓存的键"""
+    return get_template_pack().version
+
+
+if __name__ == "__main__":
+    pack = compile_templates(TEMPLATE_DIR)
+    write_pack(pack, TEMPLATE_PACK_PATH)
+    print(f"已将 {len(pack.templates)} 个模板写入 {TEMPLATE_PACK_PATH}（版本 {pack.version}）")
@@ -0,0 +1,213 @@
+import heapq
+import os
+import threading
+from collections import Counter
+
+from strategy import compile_strategy, get_strategy, score_upper_bounds, unused_tile_value
+from utils import metrics
+from utils.logger import get_logger
+from utils.path import DICTIONARY_DIR
+
+
+logger = get_logger(__name__)
+
+# 剪枝阈值的重新计算间隔（按产生的候选数）
+_THRESHOLD_INTERVAL = 64
+
+
+class TrieNode:
+    """字典树节点，depth 为从该节点出发还能走过的最多字母数"""
+    __slots__ = ("children", "terminal", "depth")
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+        self.depth = 0
+
+
+def build_trie(words):
+    root = TrieNode()
+    for word in words:
+        node = root
+        for c in word:
+            child = node.children.get(c)
+            if child is None:
+                child = node.children[c] = TrieNode()
+            node = child
+        node.terminal = True
+
+    # 后序遍历计算 depth
+    stack = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        if visited:
+            node.depth = max((c.depth + 1 for c in node.children.values()), default=0)
+        else:
+            stack.append((node, True))
+            stack.extend((c, False) for c in node.children.values())
+    return root
+
+
+_local_dictionaries = None
+_local_dictionaries_lock = threading.Lock()
+_tries = {}
+_tries_lock = threading.Lock()
+
+
+def local_dictionaries():
+    """dictionaries 目录下的本地词典（每行一个单词的 <名称>.txt），每个进程只扫描一次"""
+    global _local_dictionaries
+    with _local_dictionaries_lock:
+        if _local_dictionaries is None:
+            if os.path.isdir(DICTIONARY_DIR):
+                _local_dictionaries = sorted(
+                    os.path.splitext(name)[0] for name in os.listdir(DICTIONARY_DIR)
+                    if name.endswith(".txt"))
+            else:
+                _local_dictionaries = []
+        return list(_local_dictionaries)
+
+
+def get_trie(dictionary):
+    """加载本地词典并构建字典树（每个进程只构建一次）"""
+    with _tries_lock:
+        if dictionary not in _tries:
+            path = os.path.join(DICTIONARY_DIR, f"{dictionary}.txt")
+            with metrics.timer("trie_build"), open(path, encoding="utf-8") as fp:
+                words = {line.strip().upper() for line in fp}
+                _tries[dictionary] = build_trie(
+                    w for w in words if w.isascii() and w.isalpha())
+            logger.info("已加载本地词典 %s（%d 个单词）", dictionary, len(words))
+        return _tries[dictionary]
+
+
+def search_words(dictionary, letters, max_length, strategy="bold97", limit=None):
+    """在本地词典的字典树上直接用牌面生成摆放方式
+
+    从左到右逐位尝试：放置填充牌 `!`，或沿字典树走一个字母（优先使用同字母的牌，
+    不足时使用万能牌 `*`）。到达单词结尾时用 fill_word / eval_word 计算得分，
+    每个 (单词, 填充数) 只保留最佳摆放，与 get_words 的结果一致。
+    指定 limit 时只保留前 limit 名，并用策略的分数上限剪掉不可能进入前 limit 的分支。
+    返回按分数降序排列的摆放字符串列表；strategy 不求解摆放时与 QAT 查询的结果格式相同，
+    按长度返回可拼出的小写单词，min_length 到 max_length 的每个长度都有对应的键。
+    """
+    from word import eval_word, fill_word
+
+    spec = get_strategy(strategy)
+    root = get_trie(dictionary)
+    min_length = spec["min_length"]
+
+    available = Counter(l[1] for l in letters if l[1] not in ('*', '!'))
+    n_star = sum(1 for l in letters if l[1] == '*')
+    n_ex = sum(1 for l in letters if l[1] == '!') if spec["solve"] else 0
+
+    # 分支的分数上限：已确定放不了粗体牌的加粗位置不计加分，
+    # 已用掉的牌（万能牌、填充牌，以及同字母非粗体牌不足时用掉的粗体牌）不计剩余牌加分
+    non_bold = Counter(l[1] for l in letters if l[0] != 'bold')
+    bold_letters = {l[1] for l in letters if l[0] == 'bold'}
+    if not spec["solve"]:
+        found = {}
+        star_value = ex_value = 0
+        bold_value = dict.fromkeys(available, 0)
+        bold_slots = frozenset()
+    else:
+        bounds_by_lost = {}
+        star_value = unused_tile_value(strategy, ('special', '*'), max_length)
+        ex_value = unused_tile_value(strategy, ('special', '!'), max_length)
+        bold_value = {c: unused_tile_value(strategy, ('bold', c), max_length) for c in available}
+        bold_slots = frozenset(slot for slot, _ in compile_strategy(strategy, max_length).bold_bonus)
+        best = {}  # (单词, 填充数) -> (分数, 摆放)
+        threshold = float("-inf")
+        since_update = 0
+
+    prune = spec["solve"] and limit
+    used = Counter()
+    perm = []
+
+    def _emit(word_len, ex_used):
+        nonlocal threshold, since_update
+        text = ''.join(perm)
+        if not spec["solve"]:
+            found.setdefault(word_len, []).append(text)
+            return
+        try:
+            place, unused = fill_word(text, letters, strategy)
+        except ValueError:
+            return
+        score = eval_word(place, unused, strategy)
+        key = (text.replace('!', ''), ex_used)
+        if key not in best or score > best[key][0]:
+            best[key] = (score, text)
+            since_update += 1
+            # 间隔随候选数增长，使重新计算阈值的总开销与候选数成线性关系
+            if limit and len(best) >= limit and \
+                    since_update >= max(_THRESHOLD_INTERVAL, len(best) // 16):
+                threshold = heapq.nlargest(limit, (v[0] for v in best.values()))[-1]
+                since_update = 0
+
+    def _bounds(lost):
+        if lost not in bounds_by_lost:
+            bounds_by_lost[lost] = score_upper_bounds(strategy, letters, max_length, lost)
+        return bounds_by_lost[lost]
+
+    def _walk(node, word_len, stars_used, ex_used, spent, lost, bounds):
+        """spent 为已用掉的牌使分数上限至少减少的值，lost 为已放不了粗体牌的加粗位置，
+        bounds 为 lost 对应的分数上限"""
+        if node.terminal and word_len >= min_length:
+            _emit(word_len, ex_used)
+
+        length = len(perm)
+        if prune:
+            reachable = min(max_length, length + node.depth + n_ex - ex_used)
+            if bounds[reachable] - spent < threshold:
+                return
+
+        if length >= max_length:
+            return
+
+        # fill_word 先填加粗位置，只有牌面里有该字母的粗体牌时这个位置才可能放上粗体
+        lost_here = None
+        if prune and length in bold_slots:
+            lost_here = lost | {length}
+            lost_bounds = _bounds(lost_here)
+
+        if ex_used < n_ex:
+            perm.append('!')
+            if lost_here:
+                _walk(node, word_len, stars_used, ex_used + 1, spent + ex_value,
+                      lost_here, lost_bounds)
+            else:
+                _walk(node, word_len, stars_used, ex_used + 1, spent + ex_value, lost, bounds)
+            perm.pop()
+
+        for c, child in node.children.items():
+            if lost_here and c not in bold_letters:
+                next_lost, next_bounds = lost_here, lost_bounds
+            else:
+                next_lost, next_bounds = lost, bounds
+            if used[c] < available[c]:
+                used[c] += 1
+                perm.append(c)
+                # 同字母的非粗体牌用完后，fill_word 必然会用掉粗体牌
+                bold_spent = bold_value[c] if used[c] > non_bold[c] else 0
+                _walk(child, word_len + 1, stars_used, ex_used, spent + bold_spent,
+                      next_lost, next_bounds)
+                perm.pop()
+                used[c] -= 1
+            elif stars_used < n_star:
+                perm.append(c)
+                _walk(child, word_len + 1, stars_used + 1, ex_used, spent + star_value,
+                      next_lost, next_bounds)
+                perm.pop()
+
+    with metrics.timer("trie_search"):
+        _walk(root, 0, 0, 0, 0, frozenset(), _bounds(frozenset()) if prune else None)
+
+    if not spec["solve"]:
+        return {length: [w.lower() for w in found.get(length, [])]
+                for length in range(max_length, min_length - 1, -1)}
+
+    ranked = sorted(best.values(), key=lambda x: x[0], reverse=True)
+    if limit:
+        ranked = ranked[:limit]
+    return [text for _, text in ranked]
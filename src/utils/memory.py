@@ -0,0 +1,47 @@
+import sys
+
+from utils.logger import get_logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PROC_STATUS = "/proc/self/status"
+_PROC_CLEAR_REFS = "/proc/self/clear_refs"
+
+logger = get_logger(__name__)
+_reset_warned = False
+
+
+def reset_peak_rss():
+    """将峰值常驻内存重置为当前值（仅 Linux），成功时返回 True
+
+    首次失败时（如容器中不允许写 clear_refs）记录一条警告，此后的峰值为进程整个生命周期的峰值。
+    """
+    global _reset_warned
+    try:
+        with open(_PROC_CLEAR_REFS, "w") as fp:
+            fp.write("5")
+        return True
+    except OSError as e:
+        if not _reset_warned:
+            _reset_warned = True
+            logger.warning("无法重置峰值常驻内存（%s），峰值内存指标将为进程整个生命周期的峰值", e)
+        return False
+
+
+def peak_rss_bytes():
+    """进程的峰值常驻内存（字节），Linux 上为上次 reset_peak_rss 以来的峰值；平台不支持时返回 None"""
+    try:
+        with open(_PROC_STATUS) as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，其他平台以 KiB 为单位
+    return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,125 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+STAGE_SECONDS = "wordatro_stage_seconds"
+CACHE_HITS = "wordatro_cache_hits_total"
+CACHE_MISSES = "wordatro_cache_misses_total"
+QAT_REQUESTS = "wordatro_qat_requests_total"
+QAT_FAILURES = "wordatro_qat_failures_total"
+QAT_SKIPPED = "wordatro_qat_skipped_total"
+WATCH_FRAMES = "wordatro_watch_frames_total"
+PEAK_RSS = "wordatro_peak_rss_bytes"
+PEAK_RSS_RESET = "wordatro_peak_rss_reset"
+LABEL_FALLBACKS = "wordatro_label_buffer_fallbacks_total"
+
+_METRIC_INFO = {
+    STAGE_SECONDS: ("summary", "Time spent in each processing stage."),
+    CACHE_HITS: ("counter", "Number of cache hits."),
+    CACHE_MISSES: ("counter", "Number of cache misses."),
+    QAT_REQUESTS: ("counter", "Number of HTTP requests sent to QAT."),
+    QAT_FAILURES: ("counter", "Number of failed HTTP requests to QAT."),
+    QAT_SKIPPED: ("counter", "Number of QAT fetches skipped because they could not reach the top results."),
+    WATCH_FRAMES: ("counter", "Number of frames seen in watch mode."),
+    PEAK_RSS: ("gauge", "Peak resident set size of the process since the last time no analysis was running (lifetime peak where it cannot be reset)."),
+    PEAK_RSS_RESET: ("gauge", "Whether the last attempt to reset the peak resident set size succeeded (1) or not (0, the peak is a lifetime peak)."),
+    LABEL_FALLBACKS: ("counter", "Number of times the reusable uint16 label buffer overflowed and a temporary int32 label array was allocated."),
+}
+
+_lock = threading.Lock()
+# (指标名, 标签) -> 计数值
+_counters: dict[tuple[str, tuple], float] = {}
+# (指标名, 标签) -> [次数, 总耗时]
+_summaries: dict[tuple[str, tuple], list[float]] = {}
+# (指标名, 标签) -> 当前值
+_gauges: dict[tuple[str, tuple], float] = {}
+
+
+def _key(name: str, labels: dict) -> tuple[str, tuple]:
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels):
+    """计数器加一（或加 amount）"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, seconds: float, **labels):
+    """记录一次耗时"""
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.setdefault(key, [0, 0.0])
+        summary[0] += 1
+        summary[1] += seconds
+
+
+@contextmanager
+def timer(stage: str):
+    """统计代码块耗时，记录到 wordatro_stage_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage)
+
+
+def set_gauge(name: str, value: float, **labels):
+    """设置瞬时值指标"""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存命中或未命中"""
+    inc(CACHE_HITS if hit else CACHE_MISSES, cache=cache)
+
+
+def reset():
+    """清空所有指标"""
+    with _lock:
+        _counters.clear()
+        _summaries.clear()
+        _gauges.clear()
+
+
+def _format_labels(labels: tuple) -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if not parts:
+        return ""
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    """整数原样输出，其余输出完整精度，避免大数被四舍五入"""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式导出所有指标"""
+    with _lock:
+        counters = dict(_counters)
+        counters.update(_gauges)
+        summaries = {k: list(v) for k, v in _summaries.items()}
+
+    families: dict[str, list[str]] = {}
+    for (name, labels), value in sorted(counters.items()):
+        families.setdefault(name, []).append(
+            f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), (count, total) in sorted(summaries.items()):
+        lines = families.setdefault(name, [])
+        lines.append(f"{name}_count{_format_labels(labels)} {_format_value(count)}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+
+    out = []
+    for name, lines in families.items():
+        metric_type, help_text = _METRIC_INFO.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {metric_type}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
@@ -6,3 +6,5 @@ TEMPLATE_DIR = os.path.join(CURRENT_DIR, 'templates')
 UPLOAD_DIR = os.path.join(CURRENT_DIR, 'uploads')
 FRONTEND_DIR = os.path.join(CURRENT_DIR, "frontend")
 ASSETS_DIR = os.path.join(FRONTEND_DIR, "assets")
+TEMPLATE_PACK_PATH = os.path.join(TEMPLATE_DIR, "templates.pack")
+DICTIONARY_DIR = os.path.join(CURRENT_DIR, "dictionaries")
@@ -18,3 +18,6 @@ INVALID_PARAMETER_RESPONSE = build_error_response(
 
 FILE_NOT_FOUND_RESPONSE = build_error_response(
     error_message="File not found.")
+
+SESSION_NOT_FOUND_RESPONSE = build_error_response(
+    error_message="Session not found.")
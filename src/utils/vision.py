@@ -0,0 +1,15 @@
+import cv2
+
+
+# 模板统一尺寸（宽, 高），识别前区域会被缩放到该尺寸
+TEMPLATE_SIZE = (128, 128)
+
+
+def extract_black_part(image):
+    """提取图像的黑色部分并二值化"""
+    if len(image.shape) > 2:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    # 提取黑色区域（0-10灰度值）
+    _, binary = cv2.threshold(image, 10, 255, cv2.THRESH_BINARY_INV)
+    return binary
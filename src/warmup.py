@@ -0,0 +1,74 @@
+import threading
+
+from utils import metrics
+from utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def _warm_vision():
+    import analyze  # noqa: F401  导入 OpenCV 与 NumPy
+
+
+def _warm_templates():
+    from template_pack import get_template_pack
+    get_template_pack().features
+
+
+def _warm_http():
+    import bs4  # noqa: F401
+    import retry.api  # noqa: F401
+    from word import get_http_session
+    get_http_session()
+
+
+def _warm_dictionaries():
+    from trie_search import get_trie, local_dictionaries
+    for name in local_dictionaries():
+        get_trie(name)
+
+
+# 需要预热的子系统，按顺序执行
+COMPONENTS = {
+    "vision": _warm_vision,
+    "templates": _warm_templates,
+    "http": _warm_http,
+    "dictionaries": _warm_dictionaries,
+}
+
+_lock = threading.Lock()
+_status = {name: "pending" for name in COMPONENTS}
+_thread = None
+
+
+def warm_up():
+    """依次加载各子系统，记录每一项的状态（pending / ready / failed）"""
+    for name, func in COMPONENTS.items():
+        try:
+            with metrics.timer(f"warmup_{name}"):
+                func()
+            state = "ready"
+        except Exception as e:
+            logger.error("预热 %s 失败: %s", name, e)
+            state = "failed"
+        with _lock:
+            _status[name] = state
+    logger.info("预热完成: %s", _status)
+
+
+def start_warm_up():
+    """在后台线程中预热（只启动一次）"""
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(
+                target=warm_up, name="warm-up", daemon=True)
+            _thread.start()
+
+
+def readiness():
+    """返回 (是否全部就绪, 各子系统状态)"""
+    with _lock:
+        status = dict(_status)
+    return all(state == "ready" for state in status.values()), status
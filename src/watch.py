@@ -0,0 +1,150 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import time
+from collections import deque
+
+import cv2
+
+from analyze import analyze_image
+from frame_source import DirectorySource, WindowSource
+from utils import metrics
+from strategy import AVAILABLE_STRATEGIES
+from utils.logger import get_logger
+from utils.path import UPLOAD_DIR
+from word import available_dictionaries, get_words
+
+
+logger = get_logger(__name__)
+
+# 牌面所在的纵向范围（放置区从 40% 开始，字母牌在 70% 以下）
+TILE_BAND = (0.4, 1.0)
+# 缩略图尺寸，比较缩略图即可判断牌面是否变化
+SIGNATURE_SIZE = (128, 32)
+# 缩略图平均灰度差超过该值即认为牌面发生变化
+DIFF_THRESHOLD = 2.0
+# 上传目录中保留最近识别的帧数（截图、调试图像与预览图），0 表示全部保留
+KEEP_FRAMES = 20
+
+
+def frame_signature(img, band=TILE_BAND, size=SIGNATURE_SIZE):
+    """截取牌面区域并缩小为灰度缩略图"""
+    height = img.shape[0]
+    top, bottom = int(band[0] * height), int(band[1] * height)
+    tile_band = img[top:bottom]
+    if len(tile_band.shape) > 2:
+        tile_band = cv2.cvtColor(tile_band, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(tile_band, size, interpolation=cv2.INTER_AREA)
+
+
+def frame_changed(prev_signature, signature, threshold=DIFF_THRESHOLD):
+    """比较两帧缩略图，返回牌面是否发生变化"""
+    if prev_signature is None or prev_signature.shape != signature.shape:
+        return True
+    return float(cv2.absdiff(prev_signature, signature).mean()) > threshold
+
+
+def watch(source, on_result, interval=0.2, dictionary="YAWL", strategy="bold97",
+          threshold=DIFF_THRESHOLD, settle_frames=0, keep_frames=KEEP_FRAMES):
+    """持续读取帧，仅在牌面变化且稳定 settle_frames 帧后才进行识别与求解
+
+    上传目录中只保留最近 keep_frames 次识别写出的文件，更早的随即删除。
+    """
+    last_signature = None  # 上一帧
+    analyzed_signature = None  # 上一次识别的帧
+    stable = 0
+    kept = deque()  # 仍保留在上传目录中的帧文件名，最早的在左
+    while True:
+        started = time.perf_counter()
+        frame = source.read()
+        if frame is None:
+            return
+
+        signature = frame_signature(frame)
+        if frame_changed(last_signature, signature, threshold):
+            stable = 0
+        else:
+            stable += 1
+        last_signature = signature
+
+        if stable >= settle_frames and frame_changed(analyzed_signature, signature, threshold):
+            metrics.inc(metrics.WATCH_FRAMES, result="analyzed")
+            analyzed_signature = signature
+            result = _analyze_frame(frame, dictionary, strategy)
+            if keep_frames:
+                kept.append(result["original_image"])
+                while len(kept) > keep_frames:
+                    _remove_frame(kept.popleft())
+            on_result(result)
+        else:
+            metrics.inc(metrics.WATCH_FRAMES, result="skipped")
+
+        elapsed = time.perf_counter() - started
+        if interval > elapsed:
+            time.sleep(interval - elapsed)
+
+
+def _analyze_frame(frame, dictionary, strategy):
+    filename = f"watch_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.png"
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with metrics.timer("artifact_write"):
+        cv2.imwrite(os.path.join(UPLOAD_DIR, filename), frame)
+
+    analyze_result = analyze_image(frame, filename)
+    words = get_words(analyze_result, dictionary=dictionary, strategy=strategy)
+    return {"original_image": filename,
+            "debug_image": analyze_result["debug_image"],
+            "words": words}
+
+
+def _remove_frame(filename):
+    """删除一帧识别写入上传目录的截图、调试图像与各区域预览图"""
+    stem = os.path.splitext(filename)[0]
+    paths = [os.path.join(UPLOAD_DIR, filename), os.path.join(UPLOAD_DIR, f"debug_{filename}")]
+    paths += glob.glob(os.path.join(glob.escape(UPLOAD_DIR), f"{glob.escape(stem)}_*.png"))
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="持续监视牌面，变化时自动识别并求解")
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument("--dir", help="按顺序回放该目录中的截图")
+    source_group.add_argument("--window", default="Wordatro!", help="游戏窗口标题（仅 Windows）")
+    parser.add_argument("--loop", action="store_true", help="回放结束后从头开始")
+    parser.add_argument("-i", "--interval", type=float, default=0.2, help="轮询间隔（秒）")
+    parser.add_argument("-t", "--threshold", type=float, default=DIFF_THRESHOLD)
+    parser.add_argument("--settle", type=int, default=0,
+                        help="牌面需保持不变的帧数，用于跳过动画过程")
+    parser.add_argument("--keep", type=int, default=KEEP_FRAMES,
+                        help="上传目录中保留最近识别的帧数，0 表示全部保留")
+    parser.add_argument("-d", "--dictionary", default="YAWL", choices=available_dictionaries())
+    parser.add_argument("-s", "--strategy", default="bold97",
+                        choices=AVAILABLE_STRATEGIES)
+    args = parser.parse_args()
+
+    if args.dir:
+        source = DirectorySource(args.dir, loop=args.loop)
+    else:
+        source = WindowSource(args.window)
+
+    def _print_result(result):
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    with source:
+        try:
+            watch(source, _print_result, interval=args.interval,
+                  dictionary=args.dictionary, strategy=args.strategy,
+                  threshold=args.threshold, settle_frames=args.settle,
+                  keep_frames=args.keep)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
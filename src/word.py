@@ -1,29 +1,64 @@
-import requests
-from bs4 import BeautifulSoup
-from bs4.element import NavigableString
-from retry import retry
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
+import heapq
 import itertools
-
+import os
+import threading
+import time
+
+from strategy import LETTER_SCORE, compile_strategy, get_strategy, score_upper_bounds
+from trie_search import local_dictionaries, search_words
+from utils import metrics
+from utils.cache import LRUCache
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 单词求解结果缓存：(单词, 牌面签名, 填充数, 策略) -> solve_word 的结果，进程内跨请求共享
+_solve_cache = LRUCache("solve_word", maxsize=int(
+    os.getenv("SOLVE_CACHE_SIZE", "65536")))
+_MISSING = object()
+
+# 只返回前若干个摆放方式，便于剪枝（本地词典剪掉搜索分支，QAT 跳过较短长度的查询）；0 表示不限制
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "100"))
+
+# QAT 服务地址与重试设置，可通过环境变量指向本地替身（见 benchmarks/qat_stub.py）
+QAT_URL = os.getenv("QAT_URL", "https://www.quinapalus.com/cgi-bin/qat")
+QAT_TIMEOUT = float(os.getenv("QAT_TIMEOUT", "10"))
+QAT_TRIES = int(os.getenv("QAT_TRIES", "3"))
+QAT_RETRY_DELAY = float(os.getenv("QAT_RETRY_DELAY", "1"))
+# 同一次求解中并发查询 QAT 的最大数量
+QAT_MAX_WORKERS = int(os.getenv("QAT_MAX_WORKERS", "5"))
+
 QAT_DICTIONARIES = ["UKACD", "YAWL", "ABLE",
                     "Moby", "PDL", "BNC", "Broda", "Union"]
 
-LETTER_SCORE = {
-    'A': 1, 'B': 3, 'C': 3, 'D': 2, 'E': 1,
-    'F': 4, 'G': 2, 'H': 4, 'I': 1, 'J': 8,
-    'K': 5, 'L': 1, 'M': 3, 'N': 1, 'O': 1,
-    'P': 3, 'Q': 10, 'R': 1, 'S': 1, 'T': 1,
-    'U': 1, 'V': 4, 'W': 4, 'X': 8, 'Y': 4,
-    'Z': 10, '*': 10, '!': 10,
-}
+# requests、BeautifulSoup 与 retry 在第一次查询时才导入，避免拖慢启动
+_session = None
+_session_lock = threading.Lock()
+
+
+def available_dictionaries():
+    """QAT 词典与 dictionaries 目录下的本地词典"""
+    return QAT_DICTIONARIES + [d for d in local_dictionaries()
+                               if d not in QAT_DICTIONARIES]
+
+
+def get_http_session():
+    """查询 QAT 使用的 HTTP 会话，首次调用时创建并在线程间复用连接"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                _session = requests.Session()
+    return _session
 
 
 def parse_html(html_content):
+    from bs4 import BeautifulSoup
+    from bs4.element import NavigableString
+
     # 创建 BeautifulSoup 对象
     soup = BeautifulSoup(html_content, 'html.parser')
 
@@ -57,9 +92,14 @@ def parse_html(html_content):
     return result
 
 
-@retry(tries=3, delay=1)
 def req_qat(pat, dict="YAWL"):
-    logger.debug(f"Requesting QAT with pattern: {pat}, dictionary: {dict}")
+    from retry.api import retry_call
+    return retry_call(_req_qat, fargs=(pat, dict),
+                      tries=QAT_TRIES, delay=QAT_RETRY_DELAY)
+
+
+def _req_qat(pat, dict):
+    logger.debug("Requesting QAT with pattern: %s, dictionary: %s", pat, dict)
     pat = pat.replace(":", "%3A")
     pat = pat.replace("/", "%2F")
     if isinstance(dict, str):
@@ -67,12 +107,48 @@ def req_qat(pat, dict="YAWL"):
             raise ValueError(
                 f"Dictionary '{dict}' is not supported. Choose from {QAT_DICTIONARIES}.")
         dict = QAT_DICTIONARIES.index(dict)
-    url = f"https://www.quinapalus.com/cgi-bin/qat?pat={pat}&dict={dict}"
-    response = requests.get(url, timeout=10)
+    url = f"{QAT_URL}?pat={pat}&dict={dict}"
+    metrics.inc(metrics.QAT_REQUESTS)
+    try:
+        with metrics.timer("qat_fetch"):
+            response = get_http_session().get(url, timeout=QAT_TIMEOUT)
+    except Exception:
+        metrics.inc(metrics.QAT_FAILURES)
+        raise
     if response.status_code != 200:
+        metrics.inc(metrics.QAT_FAILURES)
         raise ConnectionError(
             f"Failed to connect to QAT service. Status code: {response.status_code}")
-    return parse_html(response.content)
+    with metrics.timer("parse"):
+        return parse_html(response.content)
+
+
+class AdaptiveConcurrency:
+    """根据观测到的 QAT 延迟调整并发数：延迟突增时减半，否则逐步加一"""
+
+    def __init__(self, maximum, minimum=1, spike=2.0, alpha=0.2):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.spike = spike
+        self.alpha = alpha
+        self.limit = maximum
+        self.latency = None  # 延迟的指数滑动平均（秒）
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            if self.latency is not None and seconds > self.spike * self.latency:
+                self.limit = max(self.minimum, self.limit // 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1)
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += self.alpha * (seconds - self.latency)
+
+
+# 进程内跨请求共享，使并发数反映 QAT 当前的响应情况
+_qat_concurrency = AdaptiveConcurrency(QAT_MAX_WORKERS)
 
 
 def gen_perms(word, n_ex):
@@ -86,80 +162,79 @@ def gen_perms(word, n_ex):
     return perms
 
 def fill_word(word, letters, strategy):
+    table = compile_strategy(strategy, len(word))
     unused = letters.copy()
-    length = len(word)
-    place: list[tuple[str, str] | None] = [None for _ in range(length)]
+    place: list[tuple[str, str] | None] = [None] * table.length
 
-    def fill(i, order):
+    for i, order in table.fill_order:
         c = word[i]
         if c == '!':
             unused.remove(('special', '!'))
             place[i] = ('special', '!')
-            return
+            continue
         for font in order:
-            if (font, c) in unused:
-                unused.remove((font, c))
-                place[i] = (font, c)
-                return
-        if ('special', '*') in unused:
-            unused.remove(('special', '*'))
-            place[i] = ('special', '*')
-            return
-        raise ValueError(
-            f"Cannot fill position {i} in word '{word}' with order {order}, place: {place}, unused: {unused}")
-
-    if strategy.startswith("bold"):
-        b_range = []
-        if strategy == "bold97":
-            b_range = [8, 6]
-        elif strategy == "bold975":
-            b_range = [8, 6, 4]
-        for i in b_range:
-            if i >= length:
-                continue
-            fill(i, ['bold', 'underscore', 'italic', 'special', 'regular'])
-        for i in range(length - 1, -1, -1):
-            if i in b_range:
-                continue
-            if i >= 4:
-                fill(i, ['underscore', 'italic', 'special', 'regular', 'bold'])
-            else:
-                fill(i, ['italic', 'underscore', 'special', 'regular', 'bold'])
-        assert None not in place, f"Some positions in word '{word}' were not filled: {place}"
-        return place, unused
-    else:
-        raise ValueError(f"Unknown strategy: {strategy}")
-
-def eval_word(place, unused, stargy):
-    score = 0
-    n = len(place)
-    if stargy.startswith("bold"):
-        if n >= 9:
-            score += 10 ** 9
-            if place[8][0] == 'bold':
-                score += 10 ** 9
-        if n >= 7:
-            score += 10 ** 8
-            if place[6][0] == 'bold':
-                score += 10 ** 8
-        if '5' in stargy and n >= 5:
-            score += 10 ** 7
-            if place[4][0] == 'bold':
-                score += 10 ** 7
-        score += unused.count(('special', '*')) * 10 ** 6
-        score += unused.count(('special', '!')) * 10 ** 5
-        score += len([l for l in unused if l[0] == 'bold']) * 10 ** 4
-        score += sum([2 ** i for i, l in enumerate(place)
-                     if l[0] == 'underscore'])
-        score += sum([n - i for i, l in enumerate(place) if l[0] == 'italic'])
-        score += sum([LETTER_SCORE.get(l[1], 0) for l in place]) * 1e-2
-        score += sum([n - i for i, l in enumerate(place) if l[1] == '!']) * 1e-4
-        return score
-    else:
-        raise ValueError(f"Unknown strategy: {stargy}")
+            tile = (font, c)
+            if tile in unused:
+                break
+        else:
+            tile = ('special', '*')
+            if tile not in unused:
+                raise ValueError(
+                    f"Cannot fill position {i} in word '{word}' with order {order}")
+        unused.remove(tile)
+        place[i] = tile
+    return place, unused
+
+
+def eval_word(place, unused, strategy):
+    table = compile_strategy(strategy, len(place))
+    score = table.base_score
+    for slot, weight in table.bold_bonus:
+        if place[slot][0] == 'bold':
+            score += weight
+    for tile, weight in table.unused_tile_weights:
+        score += unused.count(tile) * weight
+    for l in unused:
+        score += table.unused_font_weights.get(l[0], 0)
+    for i, l in enumerate(place):
+        weights = table.font_weights.get(l[0])
+        if weights is not None:
+            score += weights[i]
+    score += sum([LETTER_SCORE.get(l[1], 0)
+                 for l in place]) * table.letter_score_weight
+    score += sum([table.filler_weights[i] for i, l in enumerate(place)
+                  if l[1] == '!']) * table.filler_weight
+    return score
+
+
+def rack_signature(letters):
+    """牌面的规范签名；fill_word 与 eval_word 的结果只与字母的多重集合有关，与顺序无关"""
+    return tuple(sorted(letters))
+
 
 def solve_word(word, letters, n_ex, strategy):
+    """求解单词的最佳摆放方式，结果按 (单词, 牌面签名, 填充数, 策略) 缓存
+
+    返回的 place 与 unused 可能被多个请求共享，调用方不应修改。
+    """
     word = word.upper()
+    rack = rack_signature(letters)
+    key = (word, rack, n_ex, strategy)
+    cached = _solve_cache.get(key, _MISSING)
+    if cached is not _MISSING:
+        return cached
+
+    best = _solve_word(word, list(rack), n_ex, strategy)
+    _solve_cache.put(key, best)
+    return best
+
+
+def solve_cache_info():
+    """求解缓存的命中统计"""
+    return _solve_cache.info()
+
+
+def _solve_word(word, letters, n_ex, strategy):
     perms = gen_perms(word, n_ex)
     results = []
     for perm in perms:
@@ -168,61 +243,140 @@ def solve_word(word, letters, n_ex, strategy):
             score = eval_word(place, unused, strategy)
             results.append((perm, place, unused, score))
         except ValueError as e:
-            logger.debug(f"Failed to fill word '{word}' with error: {e}")
+            logger.debug("Failed to fill word '%s' with error: %s", word, e)
 
     results.sort(key=lambda x: x[-1], reverse=True)  # 按分数降序排序
     return results[0] if results else None
 
 
-def get_words(analyze_result, dictionary="YAWL", strategy="bold97"):
-    logger.debug(
-        f"Getting words from analyze_result: {analyze_result}, dictionary: {dictionary}, strategy: {strategy}")
-
-    max_length = analyze_result.get('max_length', 9)
-    categories = analyze_result.get('categories', {})
-
+def extract_letters(analyze_result):
+    """从识别结果中取出每个区域最佳匹配的 (字体, 字母)"""
     letters = []
-    for category, items in categories.items():
+    for category, items in analyze_result.get('categories', {}).items():
         for item in items:
             if 'matches' in item and len(item['matches']) > 0:
                 font = item['matches'][0]['font']
                 letter = item['matches'][0]['letter']
                 letters.append((font, letter))
+    return letters
+
+
+def rack_key(analyze_result):
+    """牌面签名：字母与字体的多重集合加上最大长度，相同签名的求解结果完全一致"""
+    return (rack_signature(extract_letters(analyze_result)),
+            analyze_result.get('max_length', 9))
+
+
+def get_words(analyze_result, dictionary="YAWL", strategy="bold97"):
+    logger.debug("Getting words from analyze_result: %s, dictionary: %s, strategy: %s",
+                 analyze_result, dictionary, strategy)
+
+    max_length = analyze_result.get('max_length', 9)
+    letters = extract_letters(analyze_result)
+    spec = get_strategy(strategy)
+
+    # 本地词典：在字典树上直接搜索摆放方式
+    if dictionary in local_dictionaries():
+        words = search_words(dictionary, letters, max_length,
+                             strategy=strategy, limit=SEARCH_LIMIT)
+        if not spec["solve"]:
+            return words
+        return {0: words} if words else {}
 
-    # 初始化结果字典
-    results = {}
     pat = ''.join([l[1] for l in letters]).replace(
         "*", ".").replace("!", "").lower()
-
-    # 辅助函数：为单个长度请求单词
-    def _request_words_for_length(l):
-        try:
-            # 检查是否已有结果且不再需要短词
-            # if l < 5 and any(results.values()):
-            # return l, []  # 跳过短词
-
-            lpat = f'{l}:*/' + pat
-            words = req_qat(lpat, dict=dictionary)
-            return l, words.get(l, [])
-        except Exception as e:
-            logger.error(f"Error fetching words for length {l}: {e}")
-            return l, []
-
-    # 使用线程池并行处理
-    min_length = 1 if strategy == "none" else 5
+    min_length = spec["min_length"]
     lengths = list(range(max_length, min_length - 1, -1))
-    with ThreadPoolExecutor(max_workers=min(5, len(lengths))) as executor:  # 限制最大线程数
-        futures = [executor.submit(_request_words_for_length, l)
-                   for l in lengths]
 
+    if spec["solve"]:
+        return _fetch_and_solve(pat, lengths, letters, max_length, dictionary,
+                                strategy, limit=SEARCH_LIMIT)
+
+    # 不求解时并行查询每个长度的单词列表，并发数与求解时相同；单词统一为小写，与本地词典一致
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(QAT_MAX_WORKERS, len(lengths)))) as executor:
+        futures = {executor.submit(_fetch_length, pat, l, dictionary): l for l in lengths}
         for future in concurrent.futures.as_completed(futures):
-            l, word_list = future.result()
-            results[l] = word_list
+            results[futures[future]] = [w.lower() for w in future.result()[0]]
+
+    return results
+
+
+def _fetch_length(pat, length, dictionary):
+    """查询单个长度的单词，返回 (单词列表, 耗时)；失败时返回空列表"""
+    start = time.perf_counter()
+    try:
+        words = req_qat(f'{length}:*/' + pat, dict=dictionary).get(length, [])
+    except Exception as e:
+        logger.error("Error fetching words for length %d: %s", length, e)
+        words = []
+    return words, time.perf_counter() - start
+
 
-    if strategy == "none":
-        return results
+def _fetch_and_solve(pat, lengths, letters, max_length, dictionary, strategy, limit=None):
+    """按长度从长到短调度 QAT 查询，每个长度返回后立即求解
 
+    并发数由 _qat_concurrency 根据延迟调整。指定 limit 时，一旦已有 limit 个结果，
+    且某个长度（加上填充牌）的分数上限不超过当前第 limit 名，就跳过尚未发出的该长度查询，
+    并放弃仍在进行中的查询，它们的结果不可能进入前 limit 名。
+    """
     n_ex = ''.join([l[1] for l in letters]).count("!")
+    bounds = score_upper_bounds(strategy, letters, max_length)
+    entries = []
+    top_scores = []  # 前 limit 名分数的小根堆
+
+    def _cannot_reach(length):
+        return (limit and len(top_scores) >= limit
+                and bounds[min(max_length, length + n_ex)] <= top_scores[0])
+
+    pending = list(lengths)  # 已按长度降序排列
+    running = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(QAT_MAX_WORKERS, len(lengths))))
+    try:
+        while pending or running:
+            while pending and len(running) < _qat_concurrency.limit:
+                length = pending.pop(0)
+                if _cannot_reach(length):
+                    metrics.inc(metrics.QAT_SKIPPED)
+                    continue
+                running[executor.submit(_fetch_length, pat, length, dictionary)] = length
+            if not running:
+                break
+
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                length = running.pop(future)
+                words, elapsed = future.result()
+                _qat_concurrency.observe(elapsed)
+                with metrics.timer("solve"):
+                    solved = _solve_all({length: words}, letters, n_ex, max_length, strategy)[0]
+                entries.extend(solved)
+                if limit:
+                    for entry in solved:
+                        if len(top_scores) < limit:
+                            heapq.heappush(top_scores, entry['score'])
+                        elif entry['score'] > top_scores[0]:
+                            heapq.heapreplace(top_scores, entry['score'])
+
+            for future, length in list(running.items()):
+                if _cannot_reach(length):
+                    future.cancel()
+                    del running[future]
+                    metrics.inc(metrics.QAT_SKIPPED)
+    finally:
+        # 不等待已放弃的查询
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if not entries:
+        return {}
+    ranked = sorted(entries, key=lambda x: x['score'], reverse=True)
+    if limit:
+        ranked = ranked[:limit]
+    return {0: [x['perm'] for x in ranked]}
+
+
+def _solve_all(results, letters, n_ex, max_length, strategy):
     final_results = {0: []}
     for length, words in results.items():
         if not words:
@@ -243,14 +397,8 @@ def get_words(analyze_result, dictionary="YAWL", strategy="bold97"):
                         })
                 except ValueError as e:
                     logger.debug(
-                        f"Failed to solve word '{word}' with error: {e}")
-    ret = {}
-    for length, words in final_results.items():
-        if words:
-            ret[length] = sorted(
-                words, key=lambda x: x['score'], reverse=True)
-            ret[length] = [x['perm'] for x in ret[length]]
-    return ret
+                        "Failed to solve word '%s' with error: %s", word, e)
+    return final_results
 
 
 if __name__ == "__main__":